@@ -1,16 +1,24 @@
+from library.interned_type import *
 from library.statement import *
 from library.expression import *
 from library.addition_expression import *
 from library.constraint_system import *
 from library.division_expression import *
 from library.equation import *
+from library.linear_form import *
 from library.literal_expression import *
 from library.multiplication_expression import *
 from library.subtraction_expression import *
 from library.variable_expression import *
 from library.statement_visitor import *
 from library.statement_walker import *
+from library.traversal import *
 from library.manipulations import *
 from library.solver import *
+from library.linear_solver import *
+from library.compiler import *
+from library.spatial_index import *
 from library.layout import *
 from library.parser import *
+from library.system_cache import *
+from library.version import *
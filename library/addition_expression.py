@@ -3,6 +3,7 @@ from library.expression import *
 
 class AdditionExpression(Expression):
   '''Implements an Expression for the addition of two sub-expressions.'''
+  __slots__ = ('_left', '_right')
 
   def __init__(self, left, right):
     '''
@@ -10,8 +11,8 @@ class AdditionExpression(Expression):
     right sub-expression.
     '''
     super().__init__()
-    self._left = left
-    self._right = right
+    object.__setattr__(self, '_left', left)
+    object.__setattr__(self, '_right', right)
 
   @property
   def left(self):
@@ -26,9 +27,15 @@ class AdditionExpression(Expression):
   def visit(self, visitor):
     return visitor.visit_addition(self)
 
+  def _matches(self, left, right):
+    return self._left is left and self._right is right
+
   def __eq__(self, right):
-    return isinstance(right, AdditionExpression) and \
+    return self is right or isinstance(right, AdditionExpression) and \
+      self._hash == right._hash and \
       self._left == right._left and self._right == right._right
 
+  __hash__ = Expression.__hash__
+
   def __str__(self):
     return f'({self.left} + {self.right})'
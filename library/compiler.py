@@ -0,0 +1,193 @@
+import math
+
+from library.addition_expression import AdditionExpression
+from library.constraint_system import ConstraintSystem
+from library.division_expression import DivisionExpression
+from library.equation import Equation
+from library.literal_expression import LiteralExpression
+from library.multiplication_expression import MultiplicationExpression
+from library.solver import UNDERDETERMINED
+from library.subtraction_expression import SubtractionExpression
+from library.variable_expression import VariableExpression
+
+
+OPERATORS = {
+  AdditionExpression: '+',
+  SubtractionExpression: '-',
+  MultiplicationExpression: '*',
+  DivisionExpression: '/'
+}
+
+
+class CodeGenerator:
+  '''
+  Generates the source of a Python function that evaluates Expressions as a
+  flat sequence of assignments, one per distinct sub-expression. Vectorized
+  code performs divisions through a divide function that is elementwise and
+  produces NaN where the denominator is zero.
+  '''
+
+  def __init__(self, is_vectorized = False):
+    self._is_vectorized = is_vectorized
+    self._variables = {}
+    self._constants = {}
+    self._lines = []
+    self._count = 0
+
+  @property
+  def constants(self):
+    '''Returns the mapping from names to non-numeric literal values.'''
+    return {name: value for (value, name) in self._constants.values()}
+
+  def generate(self, expression, indent):
+    '''
+    Emits the assignments evaluating an Expression at a given indentation and
+    returns the Python expression holding its value.
+    '''
+    results = {}
+    stack = [(expression, False)]
+    while len(stack) != 0:
+      node, is_visited = stack.pop()
+      if id(node) in results:
+        continue
+      operator = OPERATORS.get(type(node))
+      if operator is None:
+        results[id(node)] = self._make_leaf(node)
+      elif is_visited:
+        name = f't{self._count}'
+        self._count += 1
+        left = results[id(node.left)]
+        right = results[id(node.right)]
+        if self._is_vectorized and operator == '/':
+          self._lines.append(f'{indent}{name} = divide({left}, {right})')
+        else:
+          self._lines.append(f'{indent}{name} = {left} {operator} {right}')
+        results[id(node)] = name
+      else:
+        stack.append((node, True))
+        stack.append((node.right, False))
+        stack.append((node.left, False))
+    return results[id(expression)]
+
+  def emit(self, line):
+    '''Emits a line of source.'''
+    self._lines.append(line)
+
+  def make_source(self, name):
+    '''Returns the source of a function with the emitted body.'''
+    lines = [f'def {name}(bindings):']
+    for (variable, local) in self._variables.items():
+      lines.append(f'  {local} = bindings[{variable!r}]')
+    return '\n'.join(lines + self._lines) + '\n'
+
+  def _make_leaf(self, node):
+    if isinstance(node, VariableExpression):
+      local = self._variables.get(node.name)
+      if local is None:
+        local = f'v{len(self._variables)}'
+        self._variables[node.name] = local
+      return local
+    elif isinstance(node, LiteralExpression):
+      value = node.value
+      if type(value) is int or type(value) is float and math.isfinite(value):
+        return f'({value!r})'
+      key = (type(value), id(value))
+      if key not in self._constants:
+        self._constants[key] = (value, f'k{len(self._constants)}')
+      return self._constants[key][1]
+    raise RuntimeError(f'Unable to compile {node}.')
+
+
+def compile_statement(statement):
+  '''
+  Compiles an Expression, Equation or ConstraintSystem into a function taking a
+  mapping from variable names to values. The function returns the value of an
+  Expression, the value of an Equation's expression, or a list with the value
+  of each of a ConstraintSystem's Equations. A value whose evaluation divides
+  by zero is UNDERDETERMINED, as with evaluate.
+  '''
+  generator = CodeGenerator()
+  if isinstance(statement, ConstraintSystem):
+    generator.emit('  residuals = []')
+    for constraint in statement.constraints:
+      generator.emit('  try:')
+      result = generator.generate(constraint.expression, '    ')
+      generator.emit(f'    residuals.append({result})')
+      generator.emit('  except ZeroDivisionError:')
+      generator.emit('    residuals.append(UNDERDETERMINED)')
+    generator.emit('  return residuals')
+  else:
+    if isinstance(statement, Equation):
+      statement = statement.expression
+    generator.emit('  try:')
+    result = generator.generate(statement, '    ')
+    generator.emit(f'    return {result}')
+    generator.emit('  except ZeroDivisionError:')
+    generator.emit('    return UNDERDETERMINED')
+  namespace = generator.constants
+  namespace['UNDERDETERMINED'] = UNDERDETERMINED
+  exec(compile(
+    generator.make_source('compiled'), '<compiled statement>', 'exec'),
+    namespace)
+  return namespace['compiled']
+
+
+def import_numpy():
+  '''Returns the numpy module, which is only required for vectorization.'''
+  try:
+    import numpy
+  except ImportError:
+    raise RuntimeError('Vectorized evaluation requires NumPy.')
+  return numpy
+
+
+def compile_vectorized(statement):
+  '''
+  Compiles an Expression, Equation or ConstraintSystem like compile_statement
+  into a function whose bindings may be NumPy arrays, evaluating the statement
+  for every element in a single pass. Elements whose evaluation divides by zero
+  are NaN rather than UNDERDETERMINED.
+  '''
+  numpy = import_numpy()
+  def divide(numerator, denominator):
+    numerator, denominator = numpy.broadcast_arrays(
+      numpy.asarray(numerator, dtype=float),
+      numpy.asarray(denominator, dtype=float))
+    quotient = numpy.full(numerator.shape, numpy.nan)
+    numpy.divide(numerator, denominator, out=quotient, where=denominator != 0)
+    return quotient
+  generator = CodeGenerator(True)
+  if isinstance(statement, ConstraintSystem):
+    generator.emit('  residuals = []')
+    for constraint in statement.constraints:
+      result = generator.generate(constraint.expression, '  ')
+      generator.emit(f'  residuals.append({result})')
+    generator.emit('  return residuals')
+  else:
+    if isinstance(statement, Equation):
+      statement = statement.expression
+    result = generator.generate(statement, '  ')
+    generator.emit(f'  return {result}')
+  namespace = generator.constants
+  namespace['divide'] = divide
+  exec(compile(
+    generator.make_source('compiled'), '<vectorized statement>', 'exec'),
+    namespace)
+  return namespace['compiled']
+
+
+def evaluate_vectorized(statement, bindings, solution = None):
+  '''
+  Evaluates a statement with variables bound to NumPy arrays or scalars. If a
+  Solution is given, variables that are not bound take the value of their
+  assignment and underdetermined or inconsistent variables are NaN.
+  '''
+  numpy = import_numpy()
+  if solution is not None:
+    values = {}
+    for variable in solution.underdetermined | solution.inconsistencies:
+      values[variable] = numpy.nan
+    values.update(solution.assignments)
+    values.update(bindings)
+    bindings = values
+  return compile_vectorized(statement)(bindings)
@@ -3,6 +3,7 @@ from library.statement import *
 
 class ConstraintSystem(Statement):
   '''Composes multiple Equations together into a system.'''
+  __slots__ = ('_constraints',)
 
   def __init__(self, constraints):
     '''Constructs a ConstraintSystem from a list of constraints.'''
@@ -35,6 +36,9 @@ class ConstraintSystem(Statement):
   def visit(self, visitor):
     return visitor.visit_constraint_system(self)
 
+  def __reduce__(self):
+    return (ConstraintSystem, (self._constraints,))
+
   def __eq__(self, right):
     return isinstance(right, ConstraintSystem) and \
       self._constraints == right._constraints
@@ -5,22 +5,73 @@ class Equation(Statement):
   '''
   Implements a statement representing an expression that must be equal zero.
   '''
+  __slots__ = (
+    '_expression', '_linear_form', '_is_linear_form_known', '_variables')
 
-  def __init__(self, expression):
+  def __init__(self, expression, linear_form = None, variables = None):
     '''
     Constructs an Equation specifying that an expression must be equal to zero.
+    The LinearForm of the expression may be passed in if it is already known,
+    in which case the expression may be None and is built only when requested.
+    The names of the variables the expression was written with may also be
+    passed in, so that those whose coefficients cancel in the LinearForm are
+    still reported.
     '''
     self._expression = expression
+    self._linear_form = linear_form
+    self._is_linear_form_known = linear_form is not None
+    self._variables = variables
 
   @property
   def expression(self):
+    if self._expression is None:
+      self._expression = self._linear_form.to_expression()
     return self._expression
 
+  @property
+  def has_expression(self):
+    '''
+    Returns True iff this Equation's expression exists, rather than being
+    built from its LinearForm on request.
+    '''
+    return self._expression is not None
+
+  @property
+  def variables(self):
+    '''
+    Returns the names of the variables this Equation was written with, or None
+    if they were not passed in when it was constructed.
+    '''
+    if self._variables is None:
+      return None
+    return set(self._variables)
+
+  @property
+  def linear_form(self):
+    '''
+    Returns the LinearForm of this Equation's expression, or None if the
+    expression is not linear. The form is computed once and then cached.
+    '''
+    if not self._is_linear_form_known:
+      self._linear_form = LinearForm.from_expression(self._expression)
+      self._is_linear_form_known = True
+    return self._linear_form
+
   def visit(self, visitor):
     return visitor.visit_equation(self)
 
+  def __reduce__(self):
+    return (
+      Equation, (self._expression, self._linear_form, self._variables))
+
   def __eq__(self, right):
-    return isinstance(right, Equation) and self._expression == right._expression
+    return isinstance(right, Equation) and self.expression == right.expression
+
+  def __hash__(self):
+    return hash(self.expression)
 
   def __str__(self):
-    return f'{self._expression} = 0'
+    return f'{self.expression} = 0'
+
+
+from library.linear_form import *
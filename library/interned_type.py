@@ -0,0 +1,76 @@
+import threading
+import weakref
+
+
+class InternedType(type):
+  '''
+  Metaclass that hash-conses the instances of a class. Constructing an instance
+  from arguments matching those of a live instance returns the live instance,
+  so structurally identical objects are the same object and equality checks
+  can stop at identity or a hash mismatch. The structural hash of each
+  instance is computed once and stored in its _hash attribute.
+
+  Classes define a _matches(*args) method returning whether an instance was
+  constructed from arguments identical to args, comparing interned arguments
+  by identity so that equal values of different types, such as 1 and 1.0, are
+  never conflated. Instances are held weakly in a table keyed by their hash
+  and leave it once they are no longer referenced. Instances whose arguments
+  are not hashable are not interned and have a _hash of None. Lookups that
+  miss are repeated under a per-class lock before a new instance is
+  published, so concurrent threads never intern duplicates.
+  '''
+
+  def __init__(cls, name, bases, namespace):
+    super().__init__(name, bases, namespace)
+    instances = {}
+    lock = threading.RLock()
+    def remove(reference):
+      with lock:
+        entry = instances.get(reference.key)
+        if entry is reference:
+          del instances[reference.key]
+        elif isinstance(entry, list):
+          for i in range(len(entry)):
+            if entry[i] is reference:
+              del entry[i]
+              break
+          if len(entry) == 0:
+            del instances[reference.key]
+    cls._instances = instances
+    cls._instances_lock = lock
+    cls._remove_instance = staticmethod(remove)
+
+  def _find_instance(cls, key, args):
+    entry = cls._instances.get(key)
+    if entry is not None:
+      for reference in entry if isinstance(entry, list) else (entry,):
+        instance = reference()
+        if instance is not None and instance._matches(*args):
+          return instance
+    return None
+
+  def __call__(cls, *args):
+    try:
+      key = hash((cls.__name__,) + args)
+    except TypeError:
+      instance = super().__call__(*args)
+      object.__setattr__(instance, '_hash', None)
+      return instance
+    instance = cls._find_instance(key, args)
+    if instance is not None:
+      return instance
+    with cls._instances_lock:
+      instance = cls._find_instance(key, args)
+      if instance is not None:
+        return instance
+      instance = super().__call__(*args)
+      object.__setattr__(instance, '_hash', key)
+      reference = weakref.KeyedRef(instance, cls._remove_instance, key)
+      entry = cls._instances.get(key)
+      if entry is None:
+        cls._instances[key] = reference
+      elif isinstance(entry, list):
+        entry.append(reference)
+      else:
+        cls._instances[key] = [entry, reference]
+      return instance
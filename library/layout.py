@@ -1,29 +1,257 @@
-import copy
+import array
+import bisect
 import enum
+import heapq
 import math
+import mmap
+import pickle
+import struct
+import sys
 
 from library.constraint_system import ConstraintSystem
 from library.equation import *
 from library.solver import *
+from library.spatial_index import *
 from library.variable_expression import *
 
 
+SIZE_PARAMETERS = frozenset(['width', 'height'])
+SPAN_PRECISION = 6
+COMPILED_LAYOUT_MAGIC = b'LYTC'
+COMPILED_LAYOUT_VERSION = 2
+COMPILED_LAYOUT_HEADER = struct.Struct('<4sHBBQQQQQQdd')
+COMPILED_LAYOUT_PROPERTIES = (
+  'top', 'left', 'width', 'height', 'width_growth', 'height_growth')
+
+
 class LayoutPolicy(enum.Enum):
   FIXED = 0
   EXPANDING = 1
 
 
+POLICIES = {policy.value: policy for policy in LayoutPolicy}
+
+
+class ItemStore:
+  '''
+  Stores the properties of LayoutItems in parallel arrays indexed by item,
+  with a table from item names to indices. Each stored item is accessed
+  through a LayoutItem viewing its index.
+  '''
+
+  def __init__(self, items = []):
+    '''Constructs an ItemStore holding copies of a list of LayoutItems.'''
+    self._names = []
+    self._indices = {}
+    self._views = []
+    self._top = array.array('d')
+    self._left = array.array('d')
+    self._width = array.array('d')
+    self._height = array.array('d')
+    self._width_policy = array.array('b')
+    self._height_policy = array.array('b')
+    for item in items:
+      self.append(item)
+
+  @property
+  def views(self):
+    '''Returns the LayoutItems viewing the stored items, in index order.'''
+    return self._views.copy()
+
+  def find(self, name):
+    '''Returns the LayoutItem viewing the item with a name, or None.'''
+    index = self._indices.get(name)
+    if index is None:
+      return None
+    return self._views[index]
+
+  def append(self, item):
+    '''Stores a copy of a LayoutItem and returns the LayoutItem viewing it.'''
+    view = LayoutItem.__new__(LayoutItem)
+    store = item._store
+    if store is None:
+      self._add(view, item._name, item._top, item._left, item._width,
+        item._width_policy.value, item._height, item._height_policy.value)
+    else:
+      index = item._index
+      self._add(view, store._names[index], store._top[index],
+        store._left[index], store._width[index], store._width_policy[index],
+        store._height[index], store._height_policy[index])
+    return view
+
+  def remove(self, name):
+    '''
+    Removes the item with a name by moving the last item into its place. The
+    removed item's LayoutItem becomes a standalone copy.
+    '''
+    index = self._indices.pop(name)
+    view = self._views[index]
+    view._set(name, self._top[index], self._left[index], self._width[index],
+      POLICIES[self._width_policy[index]], self._height[index],
+      POLICIES[self._height_policy[index]])
+    last = len(self._names) - 1
+    if index != last:
+      self._names[index] = self._names[last]
+      self._indices[self._names[index]] = index
+      self._views[index] = self._views[last]
+      self._views[index]._index = index
+      for values in (self._top, self._left, self._width, self._height,
+          self._width_policy, self._height_policy):
+        values[index] = values[last]
+    for values in (self._names, self._views, self._top, self._left,
+        self._width, self._height, self._width_policy, self._height_policy):
+      del values[last]
+
+  def _add(self, view, name, top, left, width, width_policy_code, height,
+      height_policy_code):
+    index = len(self._names)
+    self._names.append(name)
+    self._indices[name] = index
+    self._views.append(view)
+    self._top.append(top)
+    self._left.append(left)
+    self._width.append(width)
+    self._height.append(height)
+    self._width_policy.append(width_policy_code)
+    self._height_policy.append(height_policy_code)
+    view._store = self
+    view._index = index
+
+  @staticmethod
+  def from_columns(
+      names, top, left, width, height, width_policy, height_policy):
+    '''
+    Returns an ItemStore taking ownership of a list of names, four arrays of
+    doubles and two arrays of policy codes.
+    '''
+    store = ItemStore()
+    store._names = names
+    store._indices = {name: index for (index, name) in enumerate(names)}
+    store._top = top
+    store._left = left
+    store._width = width
+    store._height = height
+    store._width_policy = width_policy
+    store._height_policy = height_policy
+    for index in range(len(names)):
+      view = LayoutItem.__new__(LayoutItem)
+      view._store = store
+      view._index = index
+      store._views.append(view)
+    return store
+
+  def __len__(self):
+    return len(self._names)
+
+
 class LayoutItem:
+  '''
+  Represents a rectangular item of a Layout. A LayoutItem views an entry of an
+  ItemStore, a LayoutItem constructed directly holds its own properties and
+  has no store.
+  '''
+  __slots__ = ('_store', '_index', '_name', '_top', '_left', '_width',
+    '_width_policy', '_height', '_height_policy')
+
   def __init__(self, name, top=0, left=0, width=0,
       width_policy=LayoutPolicy.FIXED, height=0,
       height_policy=LayoutPolicy.FIXED):
-    self.name = name
-    self.top = top
-    self.left = left
-    self.width = width
-    self.width_policy = width_policy
-    self.height = height
-    self.height_policy = height_policy
+    self._set(name, top, left, width, width_policy, height, height_policy)
+
+  def _set(self, name, top, left, width, width_policy, height, height_policy):
+    self._store = None
+    self._index = None
+    self._name = name
+    self._top = top
+    self._left = left
+    self._width = width
+    self._width_policy = width_policy
+    self._height = height
+    self._height_policy = height_policy
+
+  @property
+  def name(self):
+    if self._store is None:
+      return self._name
+    return self._store._names[self._index]
+
+  @property
+  def top(self):
+    if self._store is None:
+      return self._top
+    return self._store._top[self._index]
+
+  @top.setter
+  def top(self, top):
+    if self._store is None:
+      self._top = top
+    else:
+      self._store._top[self._index] = top
+
+  @property
+  def left(self):
+    if self._store is None:
+      return self._left
+    return self._store._left[self._index]
+
+  @left.setter
+  def left(self, left):
+    if self._store is None:
+      self._left = left
+    else:
+      self._store._left[self._index] = left
+
+  @property
+  def width(self):
+    if self._store is None:
+      return self._width
+    return self._store._width[self._index]
+
+  @width.setter
+  def width(self, width):
+    if self._store is None:
+      self._width = width
+    else:
+      self._store._width[self._index] = width
+
+  @property
+  def width_policy(self):
+    if self._store is None:
+      return self._width_policy
+    return POLICIES[self._store._width_policy[self._index]]
+
+  @width_policy.setter
+  def width_policy(self, width_policy):
+    if self._store is None:
+      self._width_policy = width_policy
+    else:
+      self._store._width_policy[self._index] = width_policy.value
+
+  @property
+  def height(self):
+    if self._store is None:
+      return self._height
+    return self._store._height[self._index]
+
+  @height.setter
+  def height(self, height):
+    if self._store is None:
+      self._height = height
+    else:
+      self._store._height[self._index] = height
+
+  @property
+  def height_policy(self):
+    if self._store is None:
+      return self._height_policy
+    return POLICIES[self._store._height_policy[self._index]]
+
+  @height_policy.setter
+  def height_policy(self, height_policy):
+    if self._store is None:
+      self._height_policy = height_policy
+    else:
+      self._store._height_policy[self._index] = height_policy.value
 
   @property
   def bottom(self):
@@ -33,6 +261,17 @@ class LayoutItem:
   def right(self):
     return self.left + self.width - 1
 
+  def __copy__(self):
+    return LayoutItem(self.name, self.top, self.left, self.width,
+      self.width_policy, self.height, self.height_policy)
+
+  def __deepcopy__(self, memo):
+    return self.__copy__()
+
+  def __reduce__(self):
+    return (LayoutItem, (self.name, self.top, self.left, self.width,
+      self.width_policy, self.height, self.height_policy))
+
   def __eq__(self, other):
     return isinstance(other, LayoutItem) and \
       self.name == other.name and self.top == other.top and \
@@ -84,13 +323,19 @@ class Direction(enum.Enum):
 
 
 def build_span_system(items, width, height, direction):
-  position = 0
+  '''
+  Builds the ConstraintSystem positioning and sizing items along a direction.
+  The layout is swept across the direction, splitting it into spans at the
+  coordinates where items start or end. Every span contributes equations
+  laying out the items that cover it, in order, so that they fill the
+  layout's size. Span boundaries are rounded to SPAN_PRECISION digits so that
+  items whose solved coordinates differ only by rounding errors share them.
+  '''
   fixed_equations = []
   expanding_equations = []
   growth_equations = []
   if direction == Direction.HORIZONTAL:
     size = width
-    end = height
     get_item_span_start = lambda item: item.top
     get_item_span_end = lambda item: item.bottom
     get_item_start = lambda item: item.left
@@ -99,30 +344,21 @@ def build_span_system(items, width, height, direction):
     get_item_growth = lambda item: item.width_growth
   else:
     size = height
-    end = width
     get_item_span_start = lambda item: item.left
     get_item_span_end = lambda item: item.right
     get_item_start = lambda item: item.top
     get_item_size = lambda item: item.height
     get_item_policy = lambda item: item.height_policy
     get_item_growth = lambda item: item.height_growth
-  while position != end:
-    span_items = []
-    span_end = math.inf
-    for item in items:
-      if get_item_span_start(item) <= position and \
-          get_item_span_end(item) > position:
-        span_items.append(item)
-        span_end = min(span_end, get_item_span_end(item))
-    span_items.sort(key=get_item_start)
-    size_expression = VariableExpression(
-      'width' if direction == Direction.HORIZONTAL else 'height')
+  size_expression = VariableExpression(
+    'width' if direction == Direction.HORIZONTAL else 'height')
+  def add_span(span_items):
     growth_sum = LiteralExpression(-1)
     last_item = None
     total_size_expression = None
-    for item in span_items:
+    for (start, index, item) in span_items:
       item_expression = LayoutExpression(item.name)
-      if get_item_start(item) == 0:
+      if start == 0:
         fixed_equations.append(Equation(get_item_start(item_expression)))
       if last_item is not None:
         fixed_equations.append(Equation(get_item_start(item_expression) -
@@ -130,7 +366,7 @@ def build_span_system(items, width, height, direction):
       if get_item_policy(item) == LayoutPolicy.FIXED:
         fixed_equations.append(
           Equation(get_item_size(item_expression) - get_item_size(item)))
-      elif item.width_policy == LayoutPolicy.EXPANDING:
+      elif get_item_policy(item) == LayoutPolicy.EXPANDING:
         expanding_equations.append(
           Equation(get_item_size(item_expression) - get_item_size(item) -
             get_item_growth(item_expression) * (size_expression - size)))
@@ -144,36 +380,184 @@ def build_span_system(items, width, height, direction):
     fixed_equations.append(Equation(total_size_expression))
     if growth_sum != LiteralExpression(-1):
       growth_equations.append(Equation(growth_sum))
-    position = span_end + 1
-  growth_solution = solve(ConstraintSystem(growth_equations))
+  starts = []
+  for (index, item) in enumerate(items):
+    start = round(get_item_span_start(item), SPAN_PRECISION)
+    if round(get_item_span_end(item), SPAN_PRECISION) >= start:
+      starts.append((start, index, item))
+  starts.sort(key=lambda start: start[0:2])
+  ends = []
+  span_items = []
+  next_start = 0
+  while next_start != len(starts) or len(ends) != 0:
+    if len(ends) == 0 or next_start != len(starts) and \
+        starts[next_start][0] < ends[0][0]:
+      position = starts[next_start][0]
+    else:
+      position = ends[0][0]
+    while len(ends) != 0 and ends[0][0] == position:
+      end, index, item = heapq.heappop(ends)
+      span_items.remove((get_item_start(item), index, item))
+    while next_start != len(starts) and starts[next_start][0] == position:
+      start, index, item = starts[next_start]
+      heapq.heappush(ends, (
+        round(get_item_span_end(item) + 1, SPAN_PRECISION), index, item))
+      bisect.insort(span_items, (get_item_start(item), index, item))
+      next_start += 1
+    if len(span_items) != 0:
+      add_span(span_items)
   growth_resolution = []
-  underdetermined_growths = growth_solution.underdetermined
-  if len(underdetermined_growths) != 0:
-    base = VariableExpression(underdetermined_growths.pop())
-    for underdetermined in underdetermined_growths:
-      growth_resolution.append(
-        Equation(base - VariableExpression(underdetermined)))
+  for growth_system in decompose(ConstraintSystem(growth_equations)):
+    underdetermined_growths = sorted(solve(growth_system).underdetermined)
+    if len(underdetermined_growths) != 0:
+      base = VariableExpression(underdetermined_growths[0])
+      for underdetermined in underdetermined_growths[1:]:
+        growth_resolution.append(
+          Equation(base - VariableExpression(underdetermined)))
   return ConstraintSystem(fixed_equations + growth_equations +
     growth_resolution + expanding_equations)
 
 
+def get_structure(system):
+  '''
+  Returns a hashable description of the equations of a ConstraintSystem that
+  leaves out their literal values. The span systems built from a layout's
+  items before and after a resize have the same structure, differing only in
+  the sizes the resize assigned.
+  '''
+  structure = []
+  for constraint in system.constraints:
+    for node in iterate_pre_order(constraint):
+      if isinstance(node, VariableExpression):
+        structure.append(node.name)
+      else:
+        structure.append(type(node))
+  return tuple(structure)
+
+
+class LayoutGeometry:
+  '''
+  Stores the geometry of a Layout at a sequence of sizes in columns, with one
+  array of values per size for each property of the layout and its items.
+  '''
+
+  def __init__(self, width, height, items):
+    '''
+    Constructs a LayoutGeometry.
+
+    Arguments:
+      width - The layout's width at each size.
+      height - The layout's height at each size.
+      items - Maps each item's name to its top, left, width and height columns.
+    '''
+    self._width = width
+    self._height = height
+    self._items = items
+
+  @property
+  def width(self):
+    return self._width
+
+  @property
+  def height(self):
+    return self._height
+
+  @property
+  def names(self):
+    return list(self._items)
+
+  def get_item(self, name):
+    '''Returns the top, left, width and height columns of an item.'''
+    return self._items[name]
+
+  def __len__(self):
+    return len(self._width)
+
+
 class Layout:
   def __init__(self, items, constraints):
-    self._items = copy.deepcopy(items)
+    self._store = ItemStore(items)
+    self._items = self._store.views
     self._items.sort(key=lambda key: (key.top, key.left))
+    self._items_view = None
     self._constraints = constraints.copy()
-    self._width = 0
-    self._height = 0
-    self._name_to_item = {}
-    for item in self._items:
-      self._name_to_item[item.name] = item
-    for item in self._items:
-      self._width = max(self._width, item.left + item.width)
-      self._height = max(self._height, item.top + item.height)
+    self._update_extent()
+    self._span_systems = None
+    self._compiled_span_systems = None
+    self._component_solutions = {}
+    self._parametric_solution = None
+    self._is_parametric_solution_known = False
+    self._spatial_index = None
+
+  @staticmethod
+  def load_compiled(path):
+    '''
+    Loads a Layout saved by save_compiled. The items and the parametric
+    solution are read directly from the memory mapped file, the span systems
+    are only decoded if they are needed.
+    '''
+    with open(path, 'rb') as file:
+      with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        return Layout._read_compiled(source)
+
+  def save_compiled(self, path):
+    '''
+    Saves the layout to a file, including its span systems and parametric
+    solution, which are computed first if needed.
+    '''
+    span_systems = self._get_span_systems()
+    parametric_solution = self._get_parametric_solution()
+    store = self._store
+    names = [name.encode('utf-8') for name in store._names]
+    name_sizes = array.array('I', (len(name) for name in names))
+    indices = {id(view): index for (index, view) in enumerate(store._views)}
+    order = array.array('I', (indices[id(item)] for item in self._items))
+    geometry = array.array('d')
+    constraints = array.array('d')
+    solution_blob = b''
+    if parametric_solution is not None:
+      forms = dict(parametric_solution.forms)
+      for name in store._names:
+        for property in COMPILED_LAYOUT_PROPERTIES:
+          form = forms.pop(f'{name}.{property}', None)
+          if form is None:
+            geometry.extend((math.nan, 0, 0))
+          else:
+            geometry.extend((form.constant, form.coefficient('width'),
+              form.coefficient('height')))
+      for constraint in parametric_solution.constraints:
+        constraints.extend((constraint.constant,
+          constraint.coefficient('width'), constraint.coefficient('height')))
+      solution_blob = pickle.dumps(
+        (forms, parametric_solution.underdetermined,
+        parametric_solution.inconsistencies))
+    constraints_blob = pickle.dumps(self._constraints)
+    systems_blob = pickle.dumps(span_systems)
+    with open(path, 'wb') as file:
+      file.write(COMPILED_LAYOUT_HEADER.pack(COMPILED_LAYOUT_MAGIC,
+        COMPILED_LAYOUT_VERSION, sys.byteorder == 'big',
+        parametric_solution is not None, len(names), len(constraints) // 3,
+        sum(name_sizes), len(solution_blob), len(constraints_blob),
+        len(systems_blob), self._width, self._height))
+      file.write(name_sizes.tobytes())
+      file.write(b''.join(names))
+      file.write(order.tobytes())
+      for values in (store._top, store._left, store._width, store._height,
+          store._width_policy, store._height_policy, geometry, constraints):
+        file.write(values.tobytes())
+      file.write(solution_blob)
+      file.write(constraints_blob)
+      file.write(systems_blob)
 
   @property
   def items(self):
-    return self._items.copy()
+    '''
+    Returns the items ordered by position as a tuple, which is built once and
+    shared by every call until the items are added, removed or reordered.
+    '''
+    if self._items_view is None:
+      self._items_view = tuple(self._items)
+    return self._items_view
 
   @property
   def constraints(self):
@@ -187,11 +571,362 @@ class Layout:
   def height(self):
     return self._height
 
-  def resize(self, width, height):
-    rows_system = build_span_system(
-      self._items, self._width, self._height, Direction.HORIZONTAL)
-    columns_system = build_span_system(
-      self._items, self._width, self._height, Direction.VERTICAL)
+  def invalidate(self):
+    '''
+    Discards the span systems and solution cached for the layout's items. Must
+    be called after the spans, policies or ordering of the items change.
+    '''
+    self._span_systems = None
+    self._compiled_span_systems = None
+    self._component_solutions = {}
+    self._parametric_solution = None
+    self._is_parametric_solution_known = False
+    self._spatial_index = None
+
+  def add_item(self, item):
+    '''Adds a copy of a LayoutItem to the layout.'''
+    if self._store.find(item.name) is not None:
+      raise RuntimeError(f'Item {item.name} already exists.')
+    self._items.append(self._store.append(item))
+    self._update_items()
+
+  def remove_item(self, name):
+    '''Removes the item with a given name from the layout.'''
+    item = self._get_item(name)
+    for i in range(len(self._items)):
+      if self._items[i] is item:
+        del self._items[i]
+        break
+    self._store.remove(name)
+    self._update_items()
+
+  def set_policy(self, name, width_policy, height_policy):
+    '''Sets the width and height policies of the item with a given name.'''
+    item = self._get_item(name)
+    item.width_policy = width_policy
+    item.height_policy = height_policy
+    self._update_items()
+
+  def move_item(self, name, top, left):
+    '''Moves the item with a given name to a new position.'''
+    item = self._get_item(name)
+    item.top = top
+    item.left = left
+    self._update_items()
+
+  def items_at(self, x, y):
+    '''Returns the items containing a point, in the order of items.'''
+    return self._get_items(self._get_spatial_index().query_point(x, y))
+
+  def items_in(self, rect):
+    '''
+    Returns the items intersecting a rectangle given as a tuple
+    (top, left, width, height), in the order of items.
+    '''
+    top, left, width, height = rect
+    return self._get_items(self._get_spatial_index().query_rect(
+      top, left, top + height - 1, left + width - 1))
+
+  def resize(self, width, height, diff = False):
+    '''
+    Resizes the layout to a requested size. If diff is True, returns a list of
+    tuples (item, old, new) for each item whose geometry changed, where old and
+    new are the item's (top, left, width, height) before and after the resize.
+    '''
+    solution = self._solve_size(width, height)
+    changes = {}
+    for (case, value) in solution.assignments.items():
+      name_index = case.find('.')
+      if name_index == -1:
+        continue
+      item = self._store.find(case[0:name_index])
+      property = case[name_index + 1:]
+      if property in ('top', 'left', 'width', 'height') and \
+          abs(getattr(item, property) - value) > EPSILON:
+        if diff and item.name not in changes:
+          changes[item.name] = \
+            (item, (item.top, item.left, item.width, item.height))
+        setattr(item, property, value)
+    if abs(self._width - solution.assignments['width']) > EPSILON:
+      self._width = float(solution.assignments['width'])
+    if abs(self._height - solution.assignments['height']) > EPSILON:
+      self._height = float(solution.assignments['height'])
+    self._spatial_index = None
+    if diff:
+      return [(item, old, (item.top, item.left, item.width, item.height))
+        for (item, old) in changes.values()]
+
+  def resize_many(self, sizes):
+    '''
+    Returns the LayoutGeometry of the layout at each of a sequence of
+    (width, height) pairs without resizing the layout.
+    '''
+    parametric_solution = self._get_parametric_solution()
+    bindings = []
+    solutions = {}
+    for (width, height) in sizes:
+      binding = None
+      if parametric_solution is not None:
+        binding = self._resolve_size(parametric_solution, width, height)
+      if binding is None:
+        solution = self._solve(width, height)
+        solutions[len(bindings)] = solution
+        binding = {'width': solution.assignments['width'],
+          'height': solution.assignments['height']}
+      bindings.append(binding)
+    if parametric_solution is None:
+      forms = {}
+    else:
+      forms = parametric_solution.forms
+    def make_column(variable, default):
+      form = forms.get(variable)
+      column = array.array('d')
+      for (i, binding) in enumerate(bindings):
+        solution = solutions.get(i)
+        if solution is not None:
+          column.append(solution.assignments.get(variable, default))
+        elif form is None:
+          column.append(default)
+        else:
+          column.append(form.evaluate(binding))
+      return column
+    items = {}
+    for item in self._items:
+      items[item.name] = (make_column(f'{item.name}.top', item.top),
+        make_column(f'{item.name}.left', item.left),
+        make_column(f'{item.name}.width', item.width),
+        make_column(f'{item.name}.height', item.height))
+    return LayoutGeometry(
+      array.array('d', (binding['width'] for binding in bindings)),
+      array.array('d', (binding['height'] for binding in bindings)), items)
+
+  def _solve_size(self, width, height):
+    '''Returns the Solution of the layout for a requested size.'''
+    parametric_solution = self._get_parametric_solution()
+    if parametric_solution is not None:
+      bindings = self._resolve_size(parametric_solution, width, height)
+      if bindings is not None:
+        return parametric_solution.evaluate(bindings)
+    return self._solve(width, height)
+
+  def _get_parametric_solution(self):
+    '''
+    Returns the solution of the layout's span systems with the layout's width
+    and height as parameters, or None if it can not be expressed that way. The
+    solution is computed once and reused by subsequent resizes. Each component
+    of the span systems is solved separately and its solution is kept, keyed
+    by the structure of its equations, for reuse after the layout is edited. A
+    kept solution is reused if the component's equations are unchanged, or if
+    only their sizes changed and the solution still places the component's
+    items where they are, as it does after a resize. Only components touched
+    by an edit are solved again, regardless of earlier resizes.
+    '''
+    if not self._is_parametric_solution_known:
+      rows_system, columns_system = self._get_span_systems()
+      component_solutions = {}
+      for component in decompose(
+          rows_system.merge(columns_system), SIZE_PARAMETERS):
+        key = tuple(component.constraints)
+        structure = get_structure(component)
+        previous = self._component_solutions.get(structure)
+        if previous is not None and (previous[0] == key or
+            self._is_solution_current(previous[1])):
+          solution = previous[1]
+        else:
+          solution = solve_parametric(component, SIZE_PARAMETERS)
+        component_solutions[structure] = (key, solution)
+      self._component_solutions = component_solutions
+      solutions = [solution for (key, solution) in component_solutions.values()]
+      if any(solution is None or solution.is_inconsistent
+          for solution in solutions):
+        self._parametric_solution = None
+      else:
+        self._parametric_solution = ParametricSolution.union(solutions)
+      self._is_parametric_solution_known = True
+    return self._parametric_solution
+
+  def _is_solution_current(self, solution):
+    '''
+    Returns True iff a component's ParametricSolution places each item it
+    solves at the item's current geometry for the layout's current size.
+    '''
+    if solution is None or solution.is_inconsistent:
+      return False
+    bindings = {'width': self._width, 'height': self._height}
+    for (variable, form) in solution.forms.items():
+      name, _, property = variable.rpartition('.')
+      if property in ('top', 'left', 'width', 'height'):
+        item = self._store.find(name)
+        if item is None or \
+            abs(form.evaluate(bindings) - getattr(item, property)) > EPSILON:
+          return False
+    return True
+
+  @staticmethod
+  def _resolve_size(parametric_solution, width, height):
+    '''
+    Returns the values of the width and height parameters for a requested
+    size. As with a full solve, a requested dimension that the layout can not
+    take is replaced by the one the layout's constraints determine. Returns
+    None if no such values exist.
+    '''
+    bindings = {'width': width, 'height': height}
+    for constraint in parametric_solution.constraints:
+      if abs(constraint.evaluate(bindings)) > EPSILON:
+        if len(constraint.coefficients) != 1:
+          return None
+        variable = next(iter(constraint.coefficients))
+        bindings[variable] = constraint.isolate(variable).constant
+    if not parametric_solution.is_satisfied(bindings):
+      return None
+    return bindings
+
+  def _get_item(self, name):
+    item = self._store.find(name)
+    if item is None:
+      raise RuntimeError(f'Item {name} not found.')
+    return item
+
+  def _update_items(self):
+    '''
+    Restores the order and extent of the items after an edit and discards
+    what was computed from them. The solutions of the components of the span
+    systems are kept so that only components whose equations changed are
+    solved again.
+    '''
+    self._items.sort(key=lambda key: (key.top, key.left))
+    self._items_view = None
+    self._update_extent()
+    self._span_systems = None
+    self._compiled_span_systems = None
+    self._parametric_solution = None
+    self._is_parametric_solution_known = False
+    self._spatial_index = None
+
+  def _update_extent(self):
+    '''Sets the layout's size to the extent of its items.'''
+    self._width = 0.0
+    self._height = 0.0
+    store = self._store
+    for (left, width) in zip(store._left, store._width):
+      self._width = max(self._width, left + width)
+    for (top, height) in zip(store._top, store._height):
+      self._height = max(self._height, top + height)
+
+  def _get_spatial_index(self):
+    '''
+    Returns the SpatialIndex of the items' indices, building it on first use
+    after the items have moved.
+    '''
+    if self._spatial_index is None:
+      self._spatial_index = SpatialIndex([(item.top, item.left, item.bottom,
+        item.right, index) for (index, item) in enumerate(self._items)])
+    return self._spatial_index
+
+  def _get_items(self, indices):
+    indices.sort()
+    return [self._items[index] for index in indices]
+
+  @staticmethod
+  def _read_compiled(source):
+    if len(source) < COMPILED_LAYOUT_HEADER.size:
+      raise RuntimeError('Not a compiled layout.')
+    (magic, version, is_big_endian, has_parametric_solution, count,
+      constraint_count, names_size, solution_size, constraints_size,
+      systems_size, width, height) = COMPILED_LAYOUT_HEADER.unpack_from(source)
+    if magic != COMPILED_LAYOUT_MAGIC or version != COMPILED_LAYOUT_VERSION:
+      raise RuntimeError('Not a compiled layout.')
+    size = COMPILED_LAYOUT_HEADER.size + 42 * count + names_size + \
+      constraints_size + systems_size
+    if has_parametric_solution:
+      size += 8 * 3 * (len(COMPILED_LAYOUT_PROPERTIES) * count +
+        constraint_count) + solution_size
+    if len(source) < size:
+      raise RuntimeError('Compiled layout is truncated.')
+    offset = COMPILED_LAYOUT_HEADER.size
+    is_swapped = is_big_endian != (sys.byteorder == 'big')
+    def read_array(typecode, length):
+      nonlocal offset
+      values = array.array(typecode)
+      size = length * values.itemsize
+      values.frombytes(source[offset:offset + size])
+      if is_swapped:
+        values.byteswap()
+      offset += size
+      return values
+    name_sizes = read_array('I', count)
+    if sum(name_sizes) != names_size:
+      raise RuntimeError('Not a compiled layout.')
+    names = []
+    for name_size in name_sizes:
+      names.append(source[offset:offset + name_size].decode('utf-8'))
+      offset += name_size
+    order = read_array('I', count)
+    columns = [read_array('d', count) for _ in range(4)]
+    columns.extend(read_array('b', count) for _ in range(2))
+    store = ItemStore.from_columns(names, *columns)
+    if has_parametric_solution:
+      geometry = read_array('d', 3 * len(COMPILED_LAYOUT_PROPERTIES) * count)
+      values = read_array('d', 3 * constraint_count)
+      forms, underdetermined, inconsistencies = pickle.loads(
+        source[offset:offset + solution_size])
+      offset += solution_size
+    layout = Layout.__new__(Layout)
+    layout._store = store
+    layout._items = [store._views[index] for index in order]
+    layout._items_view = None
+    layout._constraints = pickle.loads(
+      source[offset:offset + constraints_size])
+    offset += constraints_size
+    layout._width = width
+    layout._height = height
+    layout._span_systems = None
+    layout._compiled_span_systems = source[offset:offset + systems_size]
+    layout._component_solutions = {}
+    layout._parametric_solution = None
+    layout._is_parametric_solution_known = False
+    layout._spatial_index = None
+    if has_parametric_solution:
+      stride = 3 * len(COMPILED_LAYOUT_PROPERTIES)
+      for (index, name) in enumerate(names):
+        for (i, property) in enumerate(COMPILED_LAYOUT_PROPERTIES):
+          j = stride * index + 3 * i
+          if not math.isnan(geometry[j]):
+            forms[f'{name}.{property}'] = LinearForm(
+              {'width': geometry[j + 1], 'height': geometry[j + 2]},
+              geometry[j])
+      constraints = []
+      for i in range(0, len(values), 3):
+        constraints.append(LinearForm(
+          {'width': values[i + 1], 'height': values[i + 2]}, values[i]))
+      layout._parametric_solution = ParametricSolution(
+        forms, constraints, underdetermined, inconsistencies)
+      layout._is_parametric_solution_known = True
+    return layout
+
+  def _get_span_systems(self):
+    '''
+    Returns the row and column span systems. They are built, along with the
+    growth solutions they contain, from the layout's size and items at the
+    time of the first call and reused until the layout is invalidated. Since
+    expanding items grow linearly with the layout, later resizes satisfy the
+    same systems.
+    '''
+    if self._span_systems is None and \
+        self._compiled_span_systems is not None:
+      self._span_systems = pickle.loads(self._compiled_span_systems)
+      self._compiled_span_systems = None
+    if self._span_systems is None:
+      self._span_systems = (
+        build_span_system(
+          self._items, self._width, self._height, Direction.HORIZONTAL),
+        build_span_system(
+          self._items, self._width, self._height, Direction.VERTICAL))
+    return self._span_systems
+
+  def _solve(self, width, height):
+    '''Solves the layout for a requested size without parameters.'''
+    rows_system, columns_system = self._get_span_systems()
     width_system = ConstraintSystem(
       [Equation(VariableExpression('width') - width)])
     height_system = ConstraintSystem(
@@ -208,22 +943,7 @@ class Layout:
       update_solution = True
     if update_solution:
       solution = solve(system)
-    for case in solution.assignments:
-      name_index = case.find('.')
-      if name_index == -1:
-        continue
-      item = self._name_to_item[case[0:name_index]]
-      property = case[name_index + 1:]
-      if property == 'top':
-        item.top = solution.assignments[case]
-      elif property == 'left':
-        item.left = solution.assignments[case]
-      elif property == 'width':
-        item.width = solution.assignments[case]
-      elif property == 'height':
-        item.height = solution.assignments[case]
-    self._width = solution.assignments['width']
-    self._height = solution.assignments['height']
+    return solution
 
 
 def check_is_fit(components, width, height):
@@ -0,0 +1,220 @@
+from library.addition_expression import AdditionExpression
+from library.division_expression import DivisionExpression
+from library.literal_expression import LiteralExpression
+from library.multiplication_expression import MultiplicationExpression
+from library.subtraction_expression import SubtractionExpression
+from library.variable_expression import VariableExpression
+
+
+EPSILON = 1e-9
+
+
+class LinearForm:
+  '''
+  Represents a linear expression as a mapping from variable names to their
+  coefficients plus a constant term. Variables whose coefficient is zero are
+  not stored.
+  '''
+
+  def __init__(self, coefficients = {}, constant = 0):
+    '''
+    Constructs a LinearForm representing sum(coefficients[v] * v) + constant.
+    '''
+    self._coefficients = {}
+    for (variable, coefficient) in coefficients.items():
+      if coefficient != 0:
+        self._coefficients[variable] = coefficient
+    self._constant = constant
+
+  @staticmethod
+  def from_expression(expression):
+    '''
+    Returns the LinearForm of an Expression or None if the expression is not
+    linear.
+    '''
+    return transform_post_order(expression, LINEAR_FORM_RULES)
+
+  @property
+  def coefficients(self):
+    '''Returns the mapping from variable names to coefficients.'''
+    return self._coefficients
+
+  @property
+  def constant(self):
+    '''Returns the constant term.'''
+    return self._constant
+
+  @property
+  def variables(self):
+    '''Returns the set of variables with a non-zero coefficient.'''
+    return set(self._coefficients)
+
+  @property
+  def is_constant(self):
+    '''Returns True iff no variable has a non-zero coefficient.'''
+    return len(self._coefficients) == 0
+
+  def coefficient(self, variable):
+    '''Returns the coefficient of a variable.'''
+    return self._coefficients.get(variable, 0)
+
+  def scale(self, factor):
+    '''Returns this LinearForm multiplied by a constant factor.'''
+    if factor == 0:
+      return LinearForm()
+    form = LinearForm()
+    for (variable, coefficient) in self._coefficients.items():
+      form._coefficients[variable] = factor * coefficient
+    form._constant = factor * self._constant
+    return form
+
+  def add(self, form, factor = 1):
+    '''Returns this LinearForm plus another LinearForm scaled by a factor.'''
+    result = LinearForm({}, self._constant + factor * form._constant)
+    result._coefficients = self._coefficients.copy()
+    for (variable, coefficient) in form._coefficients.items():
+      value = result._coefficients.get(variable, 0) + factor * coefficient
+      if value == 0:
+        result._coefficients.pop(variable, None)
+      else:
+        result._coefficients[variable] = value
+    return result
+
+  def substitute(self, variable, form):
+    '''Returns this LinearForm with a variable replaced by another form.'''
+    coefficient = self._coefficients.get(variable, 0)
+    if coefficient == 0:
+      return self
+    result = LinearForm()
+    result._coefficients = self._coefficients.copy()
+    del result._coefficients[variable]
+    result._constant = self._constant
+    return result.add(form, coefficient)
+
+  def isolate(self, variable):
+    '''
+    Returns the LinearForm that the variable must equal for this form to be
+    zero, or None if the variable's coefficient is zero.
+    '''
+    coefficient = self._coefficients.get(variable, 0)
+    if abs(coefficient) <= EPSILON:
+      return None
+    result = LinearForm()
+    for (v, c) in self._coefficients.items():
+      if v != variable:
+        result._coefficients[v] = -c / coefficient
+    result._constant = -self._constant / coefficient
+    return result
+
+  def evaluate(self, bindings):
+    '''
+    Returns the value of this LinearForm given a mapping from its variables to
+    values.
+    '''
+    value = self._constant
+    for (variable, coefficient) in self._coefficients.items():
+      value += coefficient * bindings[variable]
+    return value
+
+  def to_expression(self):
+    '''Returns an Expression equivalent to this LinearForm.'''
+    expression = None
+    for (variable, coefficient) in self._coefficients.items():
+      term = VariableExpression(variable)
+      if coefficient != 1:
+        term = MultiplicationExpression(LiteralExpression(coefficient), term)
+      if expression is None:
+        expression = term
+      else:
+        expression = AdditionExpression(expression, term)
+    if expression is None:
+      return LiteralExpression(self._constant)
+    if self._constant != 0:
+      expression = AdditionExpression(
+        expression, LiteralExpression(self._constant))
+    return expression
+
+  def to_equation(self):
+    '''Returns an Equation specifying that this LinearForm is equal to zero.'''
+    return Equation(None, self)
+
+  def __add__(self, right):
+    if isinstance(right, LinearForm):
+      return self.add(right)
+    return self.add(LinearForm({}, right))
+
+  def __radd__(self, left):
+    return self + left
+
+  def __sub__(self, right):
+    if isinstance(right, LinearForm):
+      return self.add(right, -1)
+    return self.add(LinearForm({}, right), -1)
+
+  def __rsub__(self, left):
+    return self.scale(-1) + left
+
+  def __neg__(self):
+    return self.scale(-1)
+
+  def __mul__(self, right):
+    return self.scale(right)
+
+  def __rmul__(self, left):
+    return self.scale(left)
+
+  def __truediv__(self, right):
+    return self.scale(1 / right)
+
+  def __reduce__(self):
+    return (LinearForm, (self._coefficients, self._constant))
+
+  def __eq__(self, right):
+    return isinstance(right, LinearForm) and \
+      self._coefficients == right._coefficients and \
+      self._constant == right._constant
+
+  def __repr__(self):
+    return f'LinearForm({self._coefficients}, {self._constant})'
+
+  def __str__(self):
+    return f'{self.to_expression()}'
+
+
+def make_literal_form(expression):
+  if not isinstance(expression.value, (int, float)):
+    return None
+  return LinearForm({}, expression.value)
+
+
+def make_multiplication_form(expression, left, right):
+  if left is None or right is None:
+    return None
+  if left.is_constant:
+    return right.scale(left._constant)
+  elif right.is_constant:
+    return left.scale(right._constant)
+  return None
+
+
+def make_division_form(expression, left, right):
+  if left is None or right is None or not right.is_constant or \
+      right._constant == 0:
+    return None
+  return left.scale(1 / right._constant)
+
+
+LINEAR_FORM_RULES = {
+  AdditionExpression: lambda expression, left, right:
+    None if left is None or right is None else left + right,
+  SubtractionExpression: lambda expression, left, right:
+    None if left is None or right is None else left - right,
+  MultiplicationExpression: make_multiplication_form,
+  DivisionExpression: make_division_form,
+  LiteralExpression: make_literal_form,
+  VariableExpression: lambda expression: LinearForm({expression.name: 1})
+}
+
+
+from library.equation import Equation
+from library.traversal import *
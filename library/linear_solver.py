@@ -0,0 +1,316 @@
+from library.linear_form import EPSILON
+from library.linear_form import LinearForm
+from library.manipulations import substitute_all
+from library.solver import Solution
+from library.solver import collect_variables
+
+
+class LinearEliminator:
+  '''
+  Reduces LinearForms into reduced row echelon form one row at a time using
+  sparse Gauss-Jordan elimination with partial pivoting. Variables designated
+  as parameters are never chosen as pivots, so the pivot variables are solved
+  in terms of the parameters, and rows left with only parameters are kept as
+  constraints on the parameters.
+  '''
+
+  def __init__(self, parameters = set()):
+    '''Constructs a LinearEliminator whose parameters are never pivots.'''
+    self._parameters = set(parameters)
+    self._rows = {}
+    self._columns = {}
+    self._inconsistencies = set()
+    self._supports = []
+    if len(self._parameters) == 0:
+      self._constraints = None
+    else:
+      self._constraints = LinearEliminator()
+
+  @property
+  def inconsistencies(self):
+    '''
+    Returns the variables involved in a row that reduced to a contradiction.
+    '''
+    return self._inconsistencies
+
+  @property
+  def constraints(self):
+    '''
+    Returns the LinearForms, in terms of the parameters only, that must be
+    equal to zero.
+    '''
+    if self._constraints is None:
+      return []
+    constraints = []
+    for (coefficients, constant, support) in self._constraints._rows.values():
+      constraints.append(LinearForm(coefficients, constant))
+    return constraints
+
+  def add(self, form, support):
+    '''
+    Adds the row form = 0 to the system, where support is the set of variables
+    of the equations the row was derived from.
+    '''
+    self._supports.append(support)
+    coefficients = form.coefficients.copy()
+    constant = form.constant
+    for variable in [v for v in coefficients if v in self._rows]:
+      coefficient = coefficients.pop(variable)
+      pivot_coefficients, pivot_constant, pivot_support = self._rows[variable]
+      for (v, c) in pivot_coefficients.items():
+        if v != variable:
+          self._accumulate(coefficients, v, -coefficient * c)
+      constant -= coefficient * pivot_constant
+      support = support | pivot_support
+    if len(coefficients) == 0:
+      if abs(constant) > EPSILON:
+        if len(support) == 0:
+          self._inconsistencies.add('')
+        else:
+          self._inconsistencies |= support
+      return
+    candidates = [v for v in coefficients if v not in self._parameters]
+    if len(candidates) == 0:
+      self._constraints.add(LinearForm(coefficients, constant), support)
+      self._inconsistencies |= self._constraints._inconsistencies
+      return
+    pivot = max(candidates, key=lambda v: abs(coefficients[v]))
+    divisor = coefficients[pivot]
+    for variable in coefficients:
+      coefficients[variable] /= divisor
+    coefficients[pivot] = 1
+    constant /= divisor
+    for row_pivot in list(self._columns.get(pivot, ())):
+      row_coefficients, row_constant, row_support = self._rows[row_pivot]
+      coefficient = row_coefficients.pop(pivot)
+      self._columns[pivot].discard(row_pivot)
+      for (v, c) in coefficients.items():
+        if v != pivot:
+          if self._accumulate(row_coefficients, v, -coefficient * c):
+            self._columns.setdefault(v, set()).add(row_pivot)
+          else:
+            self._columns.get(v, set()).discard(row_pivot)
+      self._rows[row_pivot] = (row_coefficients,
+        row_constant - coefficient * constant, row_support | support)
+    self._rows[pivot] = (coefficients, constant, support)
+    for variable in coefficients:
+      if variable != pivot:
+        self._columns.setdefault(variable, set()).add(pivot)
+
+  def propagate_inconsistencies(self):
+    '''
+    Returns the inconsistencies extended with every variable, other than a
+    parameter, of an added row whose support involves an inconsistent variable,
+    repeated until no more variables are added. This marks the same variables
+    as solve_symbolic regardless of the order of the rows and their terms.
+    '''
+    inconsistencies = self._inconsistencies.copy()
+    occurrences = {}
+    for (i, support) in enumerate(self._supports):
+      for variable in support:
+        occurrences.setdefault(variable, []).append(i)
+    pending = list(inconsistencies)
+    visited = set()
+    while len(pending) != 0:
+      for i in occurrences.get(pending.pop(), ()):
+        if i in visited:
+          continue
+        visited.add(i)
+        for variable in self._supports[i] - self._parameters:
+          if variable not in inconsistencies:
+            inconsistencies.add(variable)
+            pending.append(variable)
+    return inconsistencies
+
+  def assignments(self):
+    '''Returns the variables whose value is fully determined.'''
+    assignments = {}
+    for (pivot, (coefficients, constant, support)) in self._rows.items():
+      if len(coefficients) == 1:
+        assignments[pivot] = -constant
+    return assignments
+
+  def assignment_forms(self):
+    '''
+    Returns the variables that are determined by the parameters as
+    LinearForms over the parameters, which are constant if there are no
+    parameters.
+    '''
+    forms = {}
+    for (pivot, (coefficients, constant, support)) in self._rows.items():
+      if all(v == pivot or v in self._parameters for v in coefficients):
+        form = LinearForm({}, -constant)
+        for (variable, coefficient) in coefficients.items():
+          if variable != pivot:
+            form._coefficients[variable] = -coefficient
+        forms[pivot] = form
+    return forms
+
+  def support(self, variable):
+    '''Returns the support of the row whose pivot is a variable.'''
+    return self._rows[variable][2]
+
+  @staticmethod
+  def _accumulate(coefficients, variable, value):
+    value += coefficients.get(variable, 0)
+    if abs(value) <= EPSILON:
+      coefficients.pop(variable, None)
+      return False
+    coefficients[variable] = value
+    return True
+
+
+class ParametricSolution:
+  '''
+  Stores the solution of a ConstraintSystem in terms of a set of parameter
+  variables, each solved variable being a LinearForm over the parameters.
+  '''
+
+  def __init__(
+      self, forms, constraints, underdetermined, inconsistencies = set()):
+    '''
+    Constructs a ParametricSolution.
+
+    Arguments:
+      forms - Maps each solved variable to a LinearForm over the parameters.
+      constraints - LinearForms over the parameters that must equal zero.
+      underdetermined - The variables not determined by the parameters.
+      inconsistencies - The variables involved in a contradiction.
+    '''
+    self._forms = forms
+    self._constraints = constraints
+    self._underdetermined = underdetermined
+    self._inconsistencies = inconsistencies
+
+  @staticmethod
+  def union(solutions):
+    '''
+    Returns the ParametricSolution combining ParametricSolutions of systems
+    that share no variables other than their parameters.
+    '''
+    forms = {}
+    constraints = []
+    underdetermined = set()
+    inconsistencies = set()
+    for solution in solutions:
+      forms.update(solution._forms)
+      constraints.extend(solution._constraints)
+      underdetermined |= solution._underdetermined
+      inconsistencies |= solution._inconsistencies
+    return ParametricSolution(
+      forms, constraints, underdetermined, inconsistencies)
+
+  @property
+  def forms(self):
+    return self._forms.copy()
+
+  @property
+  def constraints(self):
+    return self._constraints.copy()
+
+  @property
+  def underdetermined(self):
+    return self._underdetermined.copy()
+
+  @property
+  def inconsistencies(self):
+    return self._inconsistencies.copy()
+
+  @property
+  def is_inconsistent(self):
+    return len(self._inconsistencies) != 0
+
+  def is_satisfied(self, bindings):
+    '''Returns True iff the parameter values satisfy every constraint.'''
+    return all(abs(constraint.evaluate(bindings)) <= EPSILON
+      for constraint in self._constraints)
+
+  def evaluate(self, bindings):
+    '''
+    Returns the Solution obtained by assigning values to the parameters, given
+    as a mapping from parameter names to values.
+    '''
+    assignments = dict(bindings)
+    for (variable, form) in self._forms.items():
+      assignments[variable] = form.evaluate(bindings)
+    return Solution(
+      assignments, self._underdetermined, self._inconsistencies)
+
+
+def eliminate(system, eliminator):
+  '''
+  Adds the equations of a ConstraintSystem to a LinearEliminator and returns
+  the set of variables in the system. Equations that are not linear are
+  deferred until substituting the variables determined so far makes them
+  linear, if that never happens then None is returned.
+  '''
+  variables = set()
+  pending = []
+  for constraint in system.constraints:
+    support = collect_variables(constraint)
+    variables |= support
+    form = constraint.linear_form
+    if form is None:
+      pending.append((constraint.expression, support))
+    else:
+      eliminator.add(form, support)
+  while len(pending) != 0:
+    assignments = eliminator.assignment_forms()
+    remaining = []
+    for (expression, support) in pending:
+      substitutions = {}
+      for variable in collect_variables(expression) & assignments.keys():
+        substitutions[variable] = assignments[variable].to_expression()
+        support = support | eliminator.support(variable)
+      expression = substitute_all(substitutions, expression)
+      form = LinearForm.from_expression(expression)
+      if form is None:
+        remaining.append((expression, support))
+      else:
+        eliminator.add(form, support)
+    if len(remaining) == len(pending):
+      return None
+    pending = remaining
+  return variables
+
+
+def solve_linear(system):
+  '''
+  Solves a ConstraintSystem by sparse Gaussian elimination. Equations that are
+  not linear are deferred until enough of their variables are assigned to make
+  them linear, if that never happens then None is returned.
+  '''
+  eliminator = LinearEliminator()
+  variables = eliminate(system, eliminator)
+  if variables is None:
+    return None
+  inconsistencies = eliminator.propagate_inconsistencies()
+  if '' in inconsistencies and len(inconsistencies) != 1:
+    inconsistencies.remove('')
+  assignments = {}
+  for (variable, value) in eliminator.assignments().items():
+    if variable not in inconsistencies:
+      assignments[variable] = value
+  underdetermined = variables - inconsistencies - assignments.keys()
+  return Solution(assignments, underdetermined, inconsistencies)
+
+
+def solve_parametric(system, parameters):
+  '''
+  Solves a ConstraintSystem in terms of a set of parameter variables, returning
+  a ParametricSolution, or None if the system has equations that do not become
+  linear once the variables determined by the parameters are substituted.
+  '''
+  eliminator = LinearEliminator(parameters)
+  variables = eliminate(system, eliminator)
+  if variables is None:
+    return None
+  inconsistencies = eliminator.propagate_inconsistencies()
+  forms = {}
+  for (variable, form) in eliminator.assignment_forms().items():
+    if variable not in inconsistencies:
+      forms[variable] = form
+  underdetermined = \
+    variables - set(parameters) - inconsistencies - forms.keys()
+  return ParametricSolution(
+    forms, eliminator.constraints, underdetermined, inconsistencies)
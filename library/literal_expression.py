@@ -3,11 +3,12 @@ from library.expression import *
 
 class LiteralExpression(Expression):
   '''Implements an Expression representing a literal value.'''
+  __slots__ = ('_value',)
 
   def __init__(self, value):
     '''Constructs a LiteralValue representing a Python object.'''
     super().__init__()
-    self._value = value
+    object.__setattr__(self, '_value', value)
 
   @property
   def type(self):
@@ -22,8 +23,17 @@ class LiteralExpression(Expression):
   def visit(self, visitor):
     return visitor.visit_literal(self)
 
+  def __reduce__(self):
+    return (LiteralExpression, (self._value,))
+
+  def _matches(self, value):
+    return type(self._value) is type(value) and self._value == value
+
   def __eq__(self, right):
-    return isinstance(right, LiteralExpression) and self._value == right._value
+    return self is right or \
+      isinstance(right, LiteralExpression) and self._value == right._value
+
+  __hash__ = Expression.__hash__
 
   def __str__(self):
     return str(self._value)
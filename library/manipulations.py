@@ -1,10 +1,113 @@
+import collections
+
 from library import AdditionExpression
+from library import ConstraintSystem
 from library import DivisionExpression
 from library import Equation
-from library import StatementVisitor
 from library import SubtractionExpression
 from library.literal_expression import LiteralExpression
 from library.multiplication_expression import MultiplicationExpression
+from library.traversal import *
+from library.variable_expression import VariableExpression
+
+
+class ManipulationCache:
+  '''
+  A bounded cache of the results of symbolic manipulations keyed on the
+  interned statements they were applied to, evicting the least recently used
+  result once full.
+  '''
+
+  def __init__(self, size = 4096):
+    '''Constructs a ManipulationCache holding at most size results.'''
+    self._size = size
+    self._results = collections.OrderedDict()
+    self._hits = 0
+    self._misses = 0
+
+  @property
+  def size(self):
+    '''Returns the maximum number of results held.'''
+    return self._size
+
+  @property
+  def hits(self):
+    '''Returns the number of lookups that found a result.'''
+    return self._hits
+
+  @property
+  def misses(self):
+    '''Returns the number of lookups that did not find a result.'''
+    return self._misses
+
+  def lookup(self, key):
+    '''Returns a tuple (is_found, result) for the result stored under a key.'''
+    try:
+      result = self._results[key]
+    except KeyError:
+      self._misses += 1
+      return False, None
+    self._results.move_to_end(key)
+    self._hits += 1
+    return True, result
+
+  def store(self, key, result):
+    '''Stores a result under a key, evicting the least recently used result.'''
+    self._results[key] = result
+    self._results.move_to_end(key)
+    while len(self._results) > self._size:
+      self._results.popitem(last=False)
+
+  def clear(self):
+    '''Removes all results and resets the statistics.'''
+    self._results.clear()
+    self._hits = 0
+    self._misses = 0
+
+  def __len__(self):
+    return len(self._results)
+
+  def __str__(self):
+    return f'ManipulationCache({len(self)}/{self._size}, ' \
+      f'hits={self._hits}, misses={self._misses})'
+
+
+_manipulation_cache = None
+
+
+def get_manipulation_cache():
+  '''Returns the ManipulationCache in use or None if caching is disabled.'''
+  return _manipulation_cache
+
+
+def set_manipulation_cache(cache):
+  '''
+  Sets the ManipulationCache used by expand, isolate and collect_variables, or
+  disables caching if cache is None. Returns the previous cache.
+  '''
+  global _manipulation_cache
+  previous = _manipulation_cache
+  _manipulation_cache = cache
+  return previous
+
+
+def memoize(function, *args):
+  '''
+  Returns function(*args), using the ManipulationCache in use if any. Arguments
+  that are not hashable bypass the cache.
+  '''
+  cache = _manipulation_cache
+  if cache is None:
+    return function(*args)
+  key = (function,) + args
+  try:
+    is_found, result = cache.lookup(key)
+  except TypeError:
+    return function(*args)
+  if not is_found:
+    result = function(*args)
+    cache.store(key, result)
+  return result
 
 
 def normalize_division(expression):
@@ -13,161 +116,231 @@ def normalize_division(expression):
   an expression of the form ((a / b) * c) into ((a * c) / b), otherwise returns
   the expression unchanged.
   '''
-  class Visitor(StatementVisitor):
-    def visit_expression(self, expression):
-      return expression
-
-    def visit_multiplication(self, expression):
-      if issubclass(type(expression.left), DivisionExpression):
-        return normalize_division(
-          (expression.left.left * expression.right) / expression.left.right)
-      elif issubclass(type(expression.right), DivisionExpression):
-        return normalize_division(
-          (expression.left * expression.right.left) / expression.right.right)
-      return expression
-  return expression.visit(Visitor())
+  while issubclass(type(expression), MultiplicationExpression):
+    if issubclass(type(expression.left), DivisionExpression):
+      expression = \
+        (expression.left.left * expression.right) / expression.left.right
+    elif issubclass(type(expression.right), DivisionExpression):
+      expression = \
+        (expression.left * expression.right.left) / expression.right.right
+    else:
+      break
+  return expression
 
 
 def expand(expression):
   '''Expands an expression by distributing all multiplications and divisions.'''
-  class Visitor(StatementVisitor):
-    def visit_expression(self, expression):
-      return expression
-
-    def visit_addition(self, expression):
-      left = expand(expression.left)
-      right = expand(expression.right)
-      if issubclass(type(right), AdditionExpression):
-        return expand((left + right.left) + right.right)
-      elif issubclass(type(left), AdditionExpression) and \
-          issubclass(type(left.right), LiteralExpression):
-        if issubclass(type(right), LiteralExpression):
-          return expand(left.left + (left.right.value + right.value))
-        return expand(left.left + right + left.right)
-      elif issubclass(type(left), LiteralExpression):
-        if issubclass(type(right), LiteralExpression):
-          return LiteralExpression(left.value + right.value)
-        return expand(right + left)
-      elif right == LiteralExpression(0):
-        return left
-      elif left == expression.left and right == expression.right:
-        return expression
-      return left + right
-
-    def visit_subtraction(self, expression):
-      left = expand(expression.left)
-      right = expand(expression.right)
-      return expand(left + -1 * right)
-
-    def visit_multiplication(self, expression):
-      left = expand(expression.left)
-      right = expand(expression.right)
-      if issubclass(type(right), MultiplicationExpression):
-        return expand((left * right.left) * right.right)
-      elif issubclass(type(left), DivisionExpression):
-        return expand((left.left * right) / left.right)
-      elif issubclass(type(right), LiteralExpression):
-        if issubclass(type(left), LiteralExpression):
-          return LiteralExpression(left.value * right.value)
-        return expand(right * left)
-      elif left == LiteralExpression(1):
-        return right
-      elif left == LiteralExpression(0):
-        return LiteralExpression(0)
-      elif issubclass(type(left), AdditionExpression):
-        return expand(left.left * right + left.right * right)
-      elif issubclass(type(right), AdditionExpression):
-        return expand(left * right.left + left * right.right)
-      elif left == expression.left and right == expression.right:
-        return expression
-      return left * right
-
-    def visit_division(self, expression):
-      left = expand(expression.left)
-      right = expand(expression.right)
-      if issubclass(type(left), DivisionExpression):
-        return expand(left.left / (left.right * right))
-      elif issubclass(type(right), DivisionExpression):
-        return expand((left.left * right.right) / right.left)
-      if issubclass(type(left), LiteralExpression) and \
-          issubclass(type(right), LiteralExpression) and \
-            right != LiteralExpression(0):
-        return LiteralExpression(left.value / right.value)
-      elif left == LiteralExpression(0):
-        return LiteralExpression(0)
-      elif right == LiteralExpression(1):
-        return left
-      elif right == LiteralExpression(-1):
-        return expand(-1 * left)
-      elif issubclass(type(left), AdditionExpression):
-        return expand(left.left / right + left.right / right)
-      elif left == expression.left and right == expression.right:
-        return expression
-      return left / right
-  return normalize_division(expression.visit(Visitor()))
+  return memoize(expand_expression, expression)
+
+
+def expand_expression(expression):
+  '''Implements expand without consulting the ManipulationCache.'''
+  return build_expanded(transform_post_order(expression, EXPAND_RULES))
+
+
+class ExpandedSum:
+  '''
+  Holds a sum produced during expansion as a deque of terms, none of which is
+  an AdditionExpression or a LiteralExpression, followed by an optional
+  non-zero constant LiteralExpression. A sum is owned by whoever holds it and
+  may be extended in place when combined, so sums are copied before being
+  combined more than once. The sum is only built into a left-deep chain of
+  AdditionExpressions once expansion is complete.
+  '''
+  __slots__ = ('terms', 'constant')
+
+  def __init__(self, terms, constant):
+    self.terms = terms
+    self.constant = constant
+
+  def copy(self):
+    return ExpandedSum(collections.deque(self.terms), self.constant)
+
+  def parts(self):
+    '''Returns the terms followed by the constant, if any.'''
+    parts = list(self.terms)
+    if self.constant is not None:
+      parts.append(self.constant)
+    return parts
+
+
+def build_expanded(value):
+  '''Returns the Expression represented by an expanded value.'''
+  if not isinstance(value, ExpandedSum):
+    return value
+  expression = None
+  for part in value.parts():
+    if expression is None:
+      expression = part
+    else:
+      expression = expression + part
+  return expression
+
+
+def to_expanded(expression):
+  '''
+  Returns the expanded value of an already expanded Expression, splitting a
+  chain of AdditionExpressions into an ExpandedSum.
+  '''
+  if not isinstance(expression, AdditionExpression):
+    return expression
+  terms = collections.deque()
+  while isinstance(expression, AdditionExpression):
+    terms.appendleft(expression.right)
+    expression = expression.left
+  terms.appendleft(expression)
+  constant = None
+  if isinstance(terms[-1], LiteralExpression):
+    constant = terms.pop()
+  return ExpandedSum(terms, constant)
+
+
+def share_expanded(value):
+  '''Returns an expanded value that may be combined without consuming it.'''
+  if isinstance(value, ExpandedSum):
+    return value.copy()
+  return value
+
+
+def split_expanded(value):
+  if isinstance(value, ExpandedSum):
+    return value.terms, value.constant
+  elif isinstance(value, LiteralExpression):
+    return collections.deque(), value
+  return collections.deque((value,)), None
+
+
+def add_expanded(left, right):
+  '''
+  Returns the expansion of the sum of two expanded values. Terms keep their
+  order and constants are summed into a single trailing constant, which is
+  dropped if it is zero.
+  '''
+  if isinstance(left, LiteralExpression) and \
+      isinstance(right, LiteralExpression):
+    return LiteralExpression(left.value + right.value)
+  left_terms, left_constant = split_expanded(left)
+  right_terms, right_constant = split_expanded(right)
+  if left_constant is not None and left_constant == LiteralExpression(0):
+    left_constant = None
+  if left_constant is None:
+    constant = right_constant
+  elif right_constant is None:
+    constant = left_constant
+  else:
+    constant = LiteralExpression(left_constant.value + right_constant.value)
+  if constant is not None and constant == LiteralExpression(0):
+    constant = None
+  if len(left_terms) >= len(right_terms):
+    left_terms.extend(right_terms)
+    terms = left_terms
+  else:
+    right_terms.extendleft(reversed(left_terms))
+    terms = right_terms
+  if len(terms) == 1 and constant is None:
+    return terms[0]
+  return ExpandedSum(terms, constant)
+
+
+def sum_expanded(values):
+  '''Returns the expansion of the sum of a sequence of expanded values.'''
+  result = None
+  for value in values:
+    if result is None:
+      result = value
+    else:
+      result = add_expanded(result, value)
+  return result
+
+
+def multiply_expanded(left, right):
+  '''Returns the expansion of the product of two expanded values.'''
+  if isinstance(right, MultiplicationExpression):
+    factors = []
+    while isinstance(right, MultiplicationExpression):
+      factors.append(right.right)
+      right = right.left
+    factors.append(right)
+    for factor in reversed(factors):
+      left = multiply_expanded(left, to_expanded(factor))
+    return left
+  elif isinstance(left, DivisionExpression):
+    return divide_expanded(multiply_expanded(to_expanded(left.left), right),
+      to_expanded(left.right))
+  elif isinstance(right, LiteralExpression):
+    if isinstance(left, LiteralExpression):
+      return LiteralExpression(left.value * right.value)
+    return multiply_expanded(right, left)
+  elif left == LiteralExpression(1):
+    return right
+  elif left == LiteralExpression(0):
+    return LiteralExpression(0)
+  elif isinstance(left, ExpandedSum):
+    return sum_expanded(multiply_expanded(part, share_expanded(right))
+      for part in left.parts())
+  elif isinstance(right, ExpandedSum):
+    return sum_expanded(
+      multiply_expanded(left, part) for part in right.parts())
+  elif isinstance(right, DivisionExpression):
+    return divide_expanded(multiply_expanded(left, to_expanded(right.left)),
+      to_expanded(right.right))
+  return left * right
+
+
+def divide_expanded(left, right):
+  '''Returns the expansion of the quotient of two expanded values.'''
+  if isinstance(left, DivisionExpression):
+    return divide_expanded(to_expanded(left.left),
+      multiply_expanded(to_expanded(left.right), right))
+  elif isinstance(right, DivisionExpression):
+    return divide_expanded(multiply_expanded(
+      to_expanded(build_expanded(left).left), to_expanded(right.right)),
+      to_expanded(right.left))
+  if isinstance(left, LiteralExpression) and \
+      isinstance(right, LiteralExpression) and \
+        right != LiteralExpression(0):
+    return LiteralExpression(left.value / right.value)
+  elif left == LiteralExpression(0):
+    return LiteralExpression(0)
+  elif right == LiteralExpression(1):
+    return left
+  elif right == LiteralExpression(-1):
+    return multiply_expanded(LiteralExpression(-1), left)
+  elif isinstance(left, ExpandedSum):
+    return sum_expanded(divide_expanded(part, share_expanded(right))
+      for part in left.parts())
+  return left / build_expanded(right)
+
+
+EXPAND_RULES = {
+  AdditionExpression:
+    lambda expression, left, right: add_expanded(left, right),
+  SubtractionExpression: lambda expression, left, right: add_expanded(
+    left, multiply_expanded(LiteralExpression(-1), right)),
+  MultiplicationExpression:
+    lambda expression, left, right: multiply_expanded(left, right),
+  DivisionExpression:
+    lambda expression, left, right: divide_expanded(left, right)
+}
 
 
 def substitute(variable, substitution, expression):
   '''
   Replaces all VariableExpressions with a substitution in a given expression.
   '''
-  class Visitor(StatementVisitor):
-    def __init__(self, variable, substitution):
-      self._variable = variable
-      self._substitution = substitution
-
-    def visit_equation(self, equation):
-      expression_substitution = substitute(
-        variable, self._substitution, equation.expression)
-      if substitution == equation.expression:
-        return equation
-      return Equation(expression_substitution)
-
-    def visit_expression(self, expression):
-      return expression
-
-    def visit_addition(self, expression):
-      left_substitution = substitute(
-        variable, self._substitution, expression.left)
-      right_substitution = substitute(
-        variable, self._substitution, expression.right)
-      if left_substitution == expression.left and \
-          right_substitution == expression.right:
-        return expression
-      return left_substitution + right_substitution
-
-    def visit_subtraction(self, expression):
-      left_substitution = substitute(
-        variable, self._substitution, expression.left)
-      right_substitution = substitute(
-        variable, self._substitution, expression.right)
-      if left_substitution == expression.left and \
-          right_substitution == expression.right:
-        return expression
-      return left_substitution - right_substitution
-
-    def visit_multiplication(self, expression):
-      left_substitution = substitute(
-        variable, self._substitution, expression.left)
-      right_substitution = substitute(
-        variable, self._substitution, expression.right)
-      if left_substitution == expression.left and \
-          right_substitution == expression.right:
-        return expression
-      return left_substitution * right_substitution
-
-    def visit_division(self, expression):
-      left_substitution = substitute(
-        variable, self._substitution, expression.left)
-      right_substitution = substitute(
-        variable, self._substitution, expression.right)
-      if left_substitution == expression.left and \
-          right_substitution == expression.right:
-        return expression
-      return left_substitution / right_substitution
-
-    def visit_variable(self, expression):
-      if expression.name == self._variable:
-        return self._substitution
-      return expression
-  return expression.visit(Visitor(variable, substitution))
+  return substitute_all({variable: substitution}, expression)
+
+
+def substitute_all(substitutions, statement):
+  '''
+  Replaces every VariableExpression whose name is a key of a mapping with the
+  Expression it maps to, in a single traversal of an Expression, Equation or
+  ConstraintSystem. Parts of the statement that contain no substituted
+  variable are returned unchanged.
+  '''
+  if len(substitutions) == 0:
+    return statement
+  return transform_pre_order(statement, {
+    VariableExpression:
+      lambda expression: substitutions.get(expression.name, expression)
+  })
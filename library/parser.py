@@ -1,131 +1,244 @@
-import collections
+import concurrent.futures
+import mmap
+import os
+import re
 
 from library.addition_expression import *
 from library.constraint_system import *
 from library.equation import *
+from library.linear_form import *
 from library.variable_expression import *
 
 
-def parse_variable(source, c):
-  '''Parses a variable and returns it as a VariableExpression.'''
-  i = c
-  while i != len(source):
-    if source[i].isdigit() and i == c or \
-        not source[i].isalnum() and not source[i] == '.':
-      break
-    i += 1
-  if i != c:
-    return VariableExpression(source[c:i]), i
-  return None, c
-
-
-def parse_literal(source, c):
-  '''Parses a literal value and returns it as a LiteralExpression.'''
-  i = c
-  has_dot = False
-  while i != len(source):
-    if source[i] == '.':
-      if has_dot:
-        break
-      has_dot = True
-    elif not source[i].isdigit():
-      break
-    i += 1
-  if i != c:
-    return LiteralExpression(float(source[c:i])), i
-  return None, c
-
-
-def parse_operator(source, c):
-  '''Parses an operator.'''
-  if source[c] == '+':
-    return AdditionExpression, c + 1
-  if source[c] == '-':
-    return SubtractionExpression, c + 1
-  if source[c] == '*':
-    return MultiplicationExpression, c + 1
-  if source[c] == '/':
-    return DivisionExpression, c + 1
-  if source[c] == '=':
-    return Equation, c + 1
-  return None
+OPERATORS = {
+  '+': AdditionExpression,
+  '-': SubtractionExpression,
+  '*': MultiplicationExpression,
+  '/': DivisionExpression,
+  '=': Equation
+}
+
+PRECEDENCES = {
+  Equation: 0,
+  AdditionExpression: 1,
+  SubtractionExpression: 1,
+  MultiplicationExpression: 2,
+  DivisionExpression: 2
+}
+
+TOKEN_PATTERN = re.compile(r'''[^\S\n]*(?:
+  (?P<variable>(?:[^\W\d_]|\.)(?:[^\W_]|\.)*)|
+  (?P<literal>\d+\.?\d*)|
+  (?P<operator>[-+*/=])|
+  (?P<open>\()|
+  (?P<close>\))|
+  (?P<newline>\n)|
+  (?P<other>\S))''', re.VERBOSE)
+
+CONSTRAINT_START_PATTERN = re.compile(r'\S')
+
+UTF8_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
 
 
 def get_precedence(operator):
   '''Returns the precedence of an operator.'''
+  return PRECEDENCES.get(operator)
+
+
+def combine_expressions(operator, left, right):
+  '''Returns the Statement applying an operator to two Expressions.'''
   if operator == Equation:
-    return 0
-  elif operator == AdditionExpression:
-    return 1
-  elif operator == SubtractionExpression:
-    return 1
-  elif operator == MultiplicationExpression:
-    return 2
-  elif operator == DivisionExpression:
-    return 2
-
-
-def pop_operators(operators, operands, precedence):
+    if isinstance(right, LiteralExpression) and right.value == 0:
+      return Equation(left)
+    return Equation(SubtractionExpression(left, right))
+  return operator(left, right)
+
+
+def combine_linear_forms(operator, left, right):
+  '''
+  Returns the LinearForm applying an operator to two LinearForms, the Equation
+  of their difference for the = operator, or None if the result is not linear.
+  '''
+  if not isinstance(left, LinearForm) or not isinstance(right, LinearForm):
+    return None
+  if operator == Equation:
+    return Equation(None, left - right)
+  return LINEAR_FORM_RULES[operator](None, left, right)
+
+
+def pop_operators(operators, operands, precedence,
+    combine = combine_expressions):
   while len(operators) != 0 and (precedence == '(' and
       operators[-1] != '(' or operators[-1] != '(' and
       get_precedence(operators[-1]) >= precedence):
     o = operators.pop()
     right = operands.pop()
     left = operands.pop()
-    if o == Equation:
-      if isinstance(right, LiteralExpression) and right.value == 0:
-        operands.append(Equation(left))
-      else:
-        operands.append(Equation(SubtractionExpression(left, right)))
-    else:
-      operands.append(o(left, right))
+    operands.append(combine(o, left, right))
   if precedence == '(':
     operators.pop()
 
 
-def parse_constraint(source, c):
-  OPERAND = 1
-  OPERATOR = 2
-  state = OPERAND
-  operands = collections.deque()
+def parse_constraint(source, c, offset = 0, linear = False):
+  '''
+  Parses the constraint starting at index c of the source and ending at the
+  end of its line. Returns the constraint and the index where it ends. The
+  offset is added to the positions reported in syntax errors.
+
+  If linear is True then coefficients are accumulated while parsing and a
+  linear equation is returned as an Equation holding only its LinearForm, its
+  expression being built from the form if it is ever requested. Any other
+  constraint is parsed into an Expression tree as usual.
+  '''
+  start = c
+  if linear:
+    combine = combine_linear_forms
+  else:
+    combine = combine_expressions
+  is_operand = True
+  operands = []
   operators = []
-  while c != len(source) and source[c] != '\n':
-    if source[c].isspace():
-      c += 1
-    elif state == OPERAND:
-      if source[c] == '(':
+  variables = set()
+  while True:
+    match = TOKEN_PATTERN.match(source, c)
+    if match is None:
+      c = len(source)
+      break
+    kind = match.lastgroup
+    if kind == 'newline':
+      c = match.start(kind)
+      break
+    c = match.end()
+    if is_operand:
+      if kind == 'variable':
+        if linear:
+          variables.add(match.group(kind))
+          operands.append(LinearForm({match.group(kind): 1}))
+        else:
+          operands.append(VariableExpression(match.group(kind)))
+        is_operand = False
+      elif kind == 'literal':
+        if linear:
+          operands.append(LinearForm({}, float(match.group(kind))))
+        else:
+          operands.append(LiteralExpression(float(match.group(kind))))
+        is_operand = False
+      elif kind == 'open':
         operators.append('(')
-        c += 1
       else:
-        operand, c = parse_variable(source, c)
-        if not operand:
-          operand, c = parse_literal(source, c)
-          if not operand:
-            raise RuntimeError(f'Syntax error at {c}.')
-        operands.append(operand)
-        state = OPERATOR
-    elif state == OPERATOR:
-      if source[c] == ')':
-        pop_operators(operators, operands, '(')
-        c += 1
-      else:
-        operator, c = parse_operator(source, c)
-        if operator is None:
-          raise RuntimeError('Operator expected.')
-        pop_operators(operators, operands, get_precedence(operator))
-        operators.append(operator)
-        state = OPERAND
-  pop_operators(operators, operands, -1)
-  return operands.pop(), c
-
-
-def parse(source):
-  c = 0
-  constraints = []
-  while c != len(source):
-    if source[c].isspace():
-      c += 1
+        raise RuntimeError(f'Syntax error at {match.start(kind) + offset}.')
+    elif kind == 'close':
+      pop_operators(operators, operands, '(', combine)
+    elif kind == 'operator':
+      operator = OPERATORS[match.group(kind)]
+      pop_operators(operators, operands, PRECEDENCES[operator], combine)
+      operators.append(operator)
+      is_operand = True
     else:
-      constraint, c = parse_constraint(source, c)
-      constraints.append(constraint)
+      raise RuntimeError('Operator expected.')
+  pop_operators(operators, operands, -1, combine)
+  constraint = operands.pop()
+  if linear:
+    if not isinstance(constraint, Equation):
+      return parse_constraint(source, start, offset)
+    constraint = Equation(None, constraint.linear_form, variables)
+  return constraint, c
+
+
+def iterate_lines(source):
+  '''
+  Yields the lines of a string, a text or binary file or a memory map, the
+  latter read from its current position. Binary lines are decoded as UTF-8.
+  '''
+  if isinstance(source, str):
+    start = 0
+    while start != len(source):
+      end = source.find('\n', start) + 1
+      if end == 0:
+        end = len(source)
+      yield source[start:end]
+      start = end
+    return
+  if isinstance(source, mmap.mmap):
+    source = iter(source.readline, b'')
+  for line in source:
+    if isinstance(line, bytes):
+      line = line.decode('utf-8')
+    yield line
+
+
+def iter_parse(source, offset = 0, linear = False):
+  '''
+  Parses constraints from a string, a text or binary file or a memory map one
+  line at a time, yielding each constraint as it is parsed so that the whole
+  source is never held in memory. Positions in syntax errors are relative to
+  the start of the source, which is at the given offset. Linear constraints
+  are parsed directly into LinearForms if linear is True, see
+  parse_constraint.
+  '''
+  for line in iterate_lines(source):
+    match = CONSTRAINT_START_PATTERN.search(line)
+    if match is not None:
+      constraint, c = parse_constraint(line, match.start(), offset, linear)
+      yield constraint
+    offset += len(line)
+
+
+def parse(source, linear = False):
+  return ConstraintSystem(list(iter_parse(source, 0, linear)))
+
+
+def parse_chunk(path, start, end, offset, linear = False):
+  '''
+  Parses the lines of a file between two byte positions, the first of which is
+  at the given character offset.
+  '''
+  with open(path, 'rb') as file:
+    file.seek(start)
+    source = file.read(end - start).decode('utf-8')
+  return list(iter_parse(source, offset, linear))
+
+
+def parse_parallel(path, workers = None, linear = False):
+  '''
+  Parses a UTF-8 file by splitting it at line boundaries into one chunk per
+  worker and parsing the chunks in a pool of processes. Returns the
+  ConstraintSystem parse would for the file's contents, with positions in
+  syntax errors relative to the start of the file.
+
+  Arguments:
+    path - The path of the file to parse.
+    workers - The number of processes, by default the number of CPUs.
+    linear - Whether to parse linear constraints directly into LinearForms.
+  '''
+  if workers is None:
+    workers = os.cpu_count() or 1
+  elif workers < 1:
+    raise RuntimeError(f'Invalid number of workers {workers}.')
+  with open(path, 'rb') as file:
+    size = os.fstat(file.fileno()).st_size
+    if size == 0:
+      return ConstraintSystem([])
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory:
+      chunks = []
+      start = 0
+      offset = 0
+      for i in range(1, workers + 1):
+        end = memory.find(b'\n', max(start, size * i // workers - 1)) + 1
+        if end == 0 or i == workers:
+          end = size
+        if end != start:
+          chunks.append((start, end, offset))
+          if end != size:
+            offset += len(
+              memory[start:end].translate(None, UTF8_CONTINUATION_BYTES))
+          start = end
+  if len(chunks) == 1:
+    return ConstraintSystem(parse_chunk(path, *chunks[0], linear))
+  constraints = []
+  with concurrent.futures.ProcessPoolExecutor(len(chunks)) as executor:
+    futures = [executor.submit(parse_chunk, path, *chunk, linear)
+      for chunk in chunks]
+    for future in futures:
+      constraints.extend(future.result())
   return ConstraintSystem(constraints)
@@ -1,12 +1,19 @@
+import concurrent.futures
 import math
+import os
 
+from library import AdditionExpression
 from library import ConstraintSystem
 from library import LiteralExpression
-from library import StatementVisitor
-from library import StatementWalker
+from library import SubtractionExpression
 from library.division_expression import DivisionExpression
 from library.expression import Expression
+from library.linear_form import EPSILON
+from library.linear_form import LinearForm
 from library.manipulations import *
+from library.multiplication_expression import MultiplicationExpression
+from library.traversal import *
+from library.variable_expression import VariableExpression
 
 
 class UnderdeterminedType:
@@ -16,53 +23,45 @@ class UnderdeterminedType:
   def __eq__(self, other):
     return isinstance(other, UnderdeterminedType)
 
+  def __reduce__(self):
+    return 'UNDERDETERMINED'
+
 UNDERDETERMINED = UnderdeterminedType()
 
 
 def evaluate(expression):
-  class Visitor(StatementVisitor):
-    def visit_addition(self, expression):
-      left = evaluate(expression.left)
-      if left is UNDERDETERMINED:
-        return UNDERDETERMINED
-      right = evaluate(expression.right)
-      if right is UNDERDETERMINED:
-        return UNDERDETERMINED
-      return left + right
-
-    def visit_subtraction(self, expression):
-      left = evaluate(expression.left)
-      if left is UNDERDETERMINED:
-        return UNDERDETERMINED
-      right = evaluate(expression.right)
-      if right is UNDERDETERMINED:
-        return UNDERDETERMINED
-      return left - right
-
-    def visit_multiplication(self, expression):
-      left = evaluate(expression.left)
-      if left is UNDERDETERMINED:
-        return UNDERDETERMINED
-      right = evaluate(expression.right)
-      if right is UNDERDETERMINED:
-        return UNDERDETERMINED
-      return left * right
-
-    def visit_division(self, expression):
-      numerator = evaluate(expression.left)
-      if numerator is UNDERDETERMINED:
-        return UNDERDETERMINED
-      denominator = evaluate(expression.right)
-      if denominator == 0 or denominator is UNDERDETERMINED:
-        return UNDERDETERMINED
-      return numerator / denominator
-
-    def visit_literal(self, expression):
-      return expression.value
-
-    def visit_variable(self, expression):
-      return expression
-  return expression.visit(Visitor())
+  return transform_post_order(expression, EVALUATION_RULES)
+
+
+def evaluate_operation(operation):
+  '''
+  Returns an evaluation rule applying an operation to the values of a binary
+  expression's operands, propagating UNDERDETERMINED.
+  '''
+  def rule(expression, left, right):
+    if left is UNDERDETERMINED or right is UNDERDETERMINED:
+      return UNDERDETERMINED
+    return operation(left, right)
+  return rule
+
+
+def evaluate_division(expression, numerator, denominator):
+  if numerator is UNDERDETERMINED:
+    return UNDERDETERMINED
+  if denominator == 0 or denominator is UNDERDETERMINED:
+    return UNDERDETERMINED
+  return numerator / denominator
+
+
+EVALUATION_RULES = {
+  AdditionExpression: evaluate_operation(lambda left, right: left + right),
+  SubtractionExpression: evaluate_operation(lambda left, right: left - right),
+  MultiplicationExpression:
+    evaluate_operation(lambda left, right: left * right),
+  DivisionExpression: evaluate_division,
+  LiteralExpression: lambda expression: expression.value,
+  VariableExpression: lambda expression: expression
+}
 
 
 class Solution:
@@ -76,7 +75,7 @@ class Solution:
 
   @property
   def is_solved(self):
-    return not self.is_underdetermined() and not self.is_inconsistent()
+    return not self.is_underdetermined and not self.is_inconsistent
 
   @property
   def assignments(self):
@@ -128,6 +127,27 @@ class Solution:
       inconsistencies.remove('')
     return Solution(assignments, underdetermined, inconsistencies)
 
+  @staticmethod
+  def union(solutions):
+    '''
+    Returns the merge of Solutions that share no variables, this is equivalent
+    to merging them one after another but runs in linear time.
+    '''
+    assignments = {}
+    underdetermined = set()
+    inconsistencies = set()
+    for solution in solutions:
+      assignments.update(solution.assignments)
+      underdetermined |= solution.underdetermined
+      inconsistencies |= solution.inconsistencies
+    if '' in inconsistencies and len(inconsistencies) != 1:
+      inconsistencies.remove('')
+    return Solution(assignments, underdetermined, inconsistencies)
+
+  def __reduce__(self):
+    return (Solution,
+      (self._assignments, self._underdetermined, self._inconsistencies))
+
   def __eq__(self, other):
     return isinstance(other, Solution) and \
       self._assignments == other._assignments and \
@@ -143,64 +163,100 @@ class Solution:
 
 
 def collect_variables(statement):
-  class Collector(StatementWalker):
-    def __init__(self):
-      self._variables = set()
+  '''Returns the set of the names of all variables in a statement.'''
+  if isinstance(statement, Equation):
+    variables = statement.variables
+    if variables is not None:
+      return variables
+    if not statement.has_expression:
+      return statement.linear_form.variables
+  if get_manipulation_cache() is None:
+    return collect_statement_variables(statement)
+  return set(memoize(collect_statement_variables, statement))
 
-    def visit_variable(self, expression):
-      self._variables.add(expression.name)
-  collector = Collector()
-  statement.visit(collector)
-  return collector._variables
 
+def collect_statement_variables(statement):
+  '''Implements collect_variables without consulting the ManipulationCache.'''
+  return {node.name for node in iterate_pre_order(statement)
+    if isinstance(node, VariableExpression)}
 
-def is_undefined(expression):
-  class Walker(StatementWalker):
-    def __init__(self):
-      self._is_undefined = False
 
-    def visit_division(self, expression):
-      if expression.right == LiteralExpression(0):
-        self._is_undefined = True
-        return
-      return StatementWalker.visit_division(self, expression)
-  walker = Walker()
-  expression.visit(walker)
-  return walker._is_undefined
-
-
-def isolate(variable, equation):
-  class Walker(StatementWalker):
-    def __init__(self):
-      self._terms = []
-      self._sign = 1
-
-    def append(self, expression):
-      if self._sign == 1:
-        self._terms.append(expression)
+def decompose(system, parameters = set()):
+  '''
+  Splits a ConstraintSystem into a list of ConstraintSystems such that no two
+  of them share a variable other than one of a set of parameters. Constraints
+  keep their relative order and constraints without variables other than
+  parameters are each placed in their own system.
+  '''
+  parents = {}
+  def find(variable):
+    root = variable
+    while parents[root] != root:
+      root = parents[root]
+    while parents[variable] != root:
+      parents[variable], variable = root, parents[variable]
+    return root
+  constraint_variables = []
+  for constraint in system.constraints:
+    variables = collect_variables(constraint) - parameters
+    constraint_variables.append(variables)
+    root = None
+    for variable in variables:
+      if variable not in parents:
+        parents[variable] = variable
+      if root is None:
+        root = find(variable)
       else:
-        self._terms.append(-1 * expression)
-
-    def visit_literal(self, expression):
-      self.append(expression)
+        other = find(variable)
+        if other != root:
+          parents[other] = root
+  components = {}
+  for (constraint, variables) in zip(system.constraints, constraint_variables):
+    if len(variables) == 0:
+      components[(None, len(components))] = [constraint]
+    else:
+      components.setdefault(find(next(iter(variables))), []).append(constraint)
+  return [ConstraintSystem(constraints) for constraints in components.values()]
 
-    def visit_division(self, expression):
-      self.append(expression)
 
-    def visit_multiplication(self, expression):
-      self.append(expression)
+def is_undefined(expression):
+  for node in iterate_pre_order(expression):
+    if isinstance(node, DivisionExpression) and \
+        node.right == LiteralExpression(0):
+      return True
+  return False
 
-    def visit_subtraction(self, expression):
-      expression.left.visit(self)
-      self._sign *= -1
-      expression.right.visit(self)
-      self._sign *= -1
 
-    def visit_variable(self, expression):
-      self.append(expression)
-  walker = Walker()
-  expand(equation.expression).visit(walker)
-  terms = walker._terms
+def isolate(variable, equation):
+  '''
+  Returns an expression that a variable must be equal to in order to satisfy
+  an Equation, or None if the variable can not be isolated.
+  '''
+  return memoize(isolate_variable, variable, equation)
+
+
+def isolate_variable(variable, equation):
+  '''Implements isolate without consulting the ManipulationCache.'''
+  form = equation.linear_form
+  if form is not None:
+    isolation = form.isolate(variable)
+    if isolation is None:
+      return None
+    return isolation.to_expression()
+  terms = []
+  pending = [(expand(equation.expression), 1)]
+  while len(pending) != 0:
+    expression, sign = pending.pop()
+    if issubclass(type(expression), AdditionExpression):
+      pending.append((expression.right, sign))
+      pending.append((expression.left, sign))
+    elif issubclass(type(expression), SubtractionExpression):
+      pending.append((expression.right, -sign))
+      pending.append((expression.left, sign))
+    elif sign == 1:
+      terms.append(expression)
+    else:
+      terms.append(-1 * expression)
   for i in range(len(terms)):
     term = terms[i]
     if issubclass(type(term), DivisionExpression):
@@ -233,30 +289,116 @@ def isolate(variable, equation):
   return result
 
 
+def make_substitution(variable, equation):
+  '''
+  Isolates a variable in an Equation and returns the expression it is equal to
+  along with that expression's LinearForm, or None if it can not be isolated.
+  '''
+  form = equation.linear_form
+  if form is not None:
+    substitution_form = form.isolate(variable)
+    if substitution_form is None:
+      return None
+    return substitution_form.to_expression(), substitution_form
+  substitution = isolate(variable, equation)
+  if substitution is None:
+    return None
+  return substitution, LinearForm.from_expression(substitution)
+
+
+def substitute_constraint(variable, substitution, constraint):
+  '''
+  Substitutes a variable in a constraint with a substitution returned by
+  make_substitution. Returns the substituted constraint and whether it is
+  still consistent.
+  '''
+  expression, substitution_form = substitution
+  constraint_form = constraint.linear_form
+  if substitution_form is not None and constraint_form is not None:
+    if constraint_form.coefficient(variable) == 0:
+      return constraint, True
+    substituted_form = constraint_form.substitute(variable, substitution_form)
+    return substituted_form.to_equation(), not substituted_form.is_constant or \
+      abs(substituted_form.constant) <= EPSILON
+  substituted_constraint = substitute(variable, expression, constraint)
+  if substituted_constraint != constraint:
+    variables = collect_variables(substituted_constraint)
+    if len(variables) == 0:
+      solution = solve_equation(substituted_constraint)
+      if solution.is_inconsistent:
+        return substituted_constraint, False
+  return substituted_constraint, True
+
+
 def make_substituted_system(variable, system):
-  substitution = isolate(variable, system.constraints[0])
+  constraints = system.constraints
+  substitution = make_substitution(variable, constraints[0])
   if substitution is None:
     return None, False
   substitutions = []
   is_consistent = True
-  for constraint in system.constraints[1:]:
-    substituted_constraint = substitute(variable, substitution, constraint)
-    if is_consistent and substituted_constraint != constraint:
-      variables = collect_variables(substituted_constraint)
-      if len(variables) == 0:
-        solution = solve_equation(substituted_constraint)
-        if solution.is_inconsistent:
-          is_consistent = False
+  for constraint in constraints[1:]:
+    substituted_constraint, is_substitution_consistent = \
+      substitute_constraint(variable, substitution, constraint)
+    is_consistent = is_consistent and is_substitution_consistent
     substitutions.append(substituted_constraint)
   return ConstraintSystem(substitutions), is_consistent
 
 
+def substitute_in_place(variable, constraints, start, occurrences):
+  '''
+  Isolates a variable in constraints[start] and substitutes it into every
+  constraint after it, modifying the list in place. The occurrences map from
+  variables to the indices of the constraints that may contain them is used to
+  skip constraints and is extended with the variables of substituted
+  constraints. Returns a trail of the (index, constraint) pairs that were
+  replaced and whether the substituted constraints are consistent, or
+  (None, False) if the variable can not be isolated.
+  '''
+  substitution = make_substitution(variable, constraints[start])
+  if substitution is None:
+    return None, False
+  trail = []
+  is_consistent = True
+  for i in sorted(occurrences.get(variable, ())):
+    if i <= start:
+      continue
+    constraint = constraints[i]
+    substituted_constraint, is_substitution_consistent = \
+      substitute_constraint(variable, substitution, constraint)
+    is_consistent = is_consistent and is_substitution_consistent
+    if substituted_constraint is not constraint:
+      trail.append((i, constraint))
+      constraints[i] = substituted_constraint
+      form = substituted_constraint.linear_form
+      if form is None:
+        variables = collect_variables(substituted_constraint)
+      else:
+        variables = form.coefficients
+      for v in variables:
+        occurrences.setdefault(v, set()).add(i)
+  return trail, is_consistent
+
+
 def solve_equation(equation):
   '''
   Solves an Equation, if it consists of more than one variable then the Solution
   shall have no assignments and all variables shall be underdetermined.
   '''
   variables = collect_variables(equation.expression)
+  form = equation.linear_form
+  if form is not None:
+    if form.is_constant:
+      if abs(form.constant) <= EPSILON:
+        return Solution(underdetermined=variables)
+      elif len(variables) == 0:
+        return Solution(inconsistencies={''})
+      return Solution(inconsistencies=variables)
+    elif len(form.coefficients) == 1:
+      (variable, coefficient), = form.coefficients.items()
+      return Solution({variable: -form.constant / coefficient},
+        underdetermined=variables - {variable})
+    return Solution(underdetermined=variables)
   if len(variables) == 0:
     if evaluate(equation.expression) == 0:
       return Solution()
@@ -266,7 +408,8 @@ def solve_equation(equation):
   while len(variables) != 0:
     variable = variables.pop()
     expression = isolate(variable, equation)
-    if issubclass(type(expression), DivisionExpression) and \
+    if expression is None or \
+        issubclass(type(expression), DivisionExpression) and \
         evaluate(expression.right) == 0:
       underdetermined.add(variable)
     else:
@@ -284,38 +427,143 @@ def solve_equation(equation):
   return Solution(assignments, underdetermined=underdetermined | unresolved)
 
 
-def solve(system):
+def solve(system, executor = None, workers = None):
   '''
   Takes a ConstraintSystem and returns a Solution that satisfies all of the
-  system's equations.
+  system's equations. The system is first decomposed into independent
+  subsystems which are solved separately. If an executor from
+  concurrent.futures or a number of workers is given then the subsystems are
+  solved concurrently, using a process pool of that many workers if no
+  executor is provided.
   '''
-  if len(system.constraints) == 0:
-    return Solution()
-  elif len(system.constraints) == 1:
-    return solve_equation(system.constraints[0])
-  substituted_system = None
-  variables = collect_variables(system.constraints[0])
-  while substituted_system is None and len(variables) != 0:
-    variable = variables.pop()
-    substituted_system, is_substitution_consistent = make_substituted_system(
-      variable, system)
-  if substituted_system is None and len(variables) == 0:
-    return solve_equation(system.constraints[0]).merge(
-      solve(ConstraintSystem(system.constraints[1:])))
-  solution = solve(substituted_system)
-  if not is_substitution_consistent:
-    solution = solution.merge(Solution(inconsistencies={variable}))
-  if solution.is_inconsistent:
-    inconsistencies = set()
-    for constraint in system.constraints:
-      variables = collect_variables(constraint)
-      if not solution.inconsistencies.isdisjoint(variables):
-        inconsistencies |= variables
-    if len(inconsistencies) != 0:
-      return solution.merge(Solution(inconsistencies=inconsistencies))
-  top_constraint = system.constraints[0]
-  for term in solution.assignments:
-    top_constraint = substitute(
-      term, LiteralExpression(solution.assignments[term]), top_constraint)
-  top_solution = solve(ConstraintSystem([top_constraint]))
-  return solution.merge(top_solution)
+  components = decompose(system)
+  if len(components) == 1:
+    return solve_subsystem(components[0])
+  if executor is None and workers is None:
+    return Solution.union(solve_subsystems(components))
+  if executor is None:
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+      return solve_concurrently(components, executor, workers)
+  return solve_concurrently(components, executor, workers)
+
+
+def solve_concurrently(systems, executor, workers = None):
+  '''
+  Solves a list of ConstraintSystems sharing no variables by submitting them to
+  an executor in batches and returns the union of their Solutions.
+  '''
+  if workers is None:
+    workers = os.cpu_count() or 1
+  batches = partition(systems, 4 * workers)
+  futures = [executor.submit(solve_subsystems, batch) for batch in batches]
+  solutions = []
+  for future in futures:
+    solutions.extend(future.result())
+  return Solution.union(solutions)
+
+
+def partition(systems, count):
+  '''
+  Splits a list of ConstraintSystems into at most count batches holding
+  roughly the same number of constraints.
+  '''
+  total = sum(len(system.constraints) for system in systems)
+  target = max(1, math.ceil(total / count))
+  batches = []
+  batch = []
+  size = 0
+  for system in systems:
+    batch.append(system)
+    size += len(system.constraints)
+    if size >= target:
+      batches.append(batch)
+      batch = []
+      size = 0
+  if len(batch) != 0:
+    batches.append(batch)
+  return batches
+
+
+def solve_subsystems(systems):
+  '''Solves each ConstraintSystem in a list and returns their Solutions.'''
+  return [solve_subsystem(system) for system in systems]
+
+
+def solve_subsystem(system):
+  '''
+  Solves a ConstraintSystem using solve_linear, falling back to solve_symbolic
+  if the system is not linear.
+  '''
+  solution = solve_linear(system)
+  if solution is not None:
+    return solution
+  return solve_symbolic(system)
+
+
+def solve_symbolic(system):
+  '''
+  Solves a ConstraintSystem by isolating a variable of the first constraint,
+  substituting it into the remaining constraints and solving those, this
+  supports any system but is slower than solve_linear.
+
+  The constraints are substituted in place within a single list, recording
+  the replaced constraints on a trail so that each level can be restored when
+  its Solution is assembled. Memory is bounded by the n constraints, one stack
+  frame per constraint, one trail entry for every constraint that contained
+  an eliminated variable and an index of the constraints each variable has
+  occurred in.
+  '''
+  constraints = system.constraints
+  occurrences = {}
+  for (i, constraint) in enumerate(constraints):
+    for variable in collect_variables(constraint):
+      occurrences.setdefault(variable, set()).add(i)
+  frames = []
+  start = 0
+  while True:
+    if start == len(constraints):
+      solution = Solution()
+      break
+    elif start == len(constraints) - 1:
+      solution = solve_equation(constraints[start])
+      break
+    trail = None
+    variables = collect_variables(constraints[start])
+    while trail is None and len(variables) != 0:
+      variable = variables.pop()
+      trail, is_substitution_consistent = substitute_in_place(
+        variable, constraints, start, occurrences)
+    if trail is None:
+      frames.append((start, None, True, None))
+    else:
+      frames.append((start, variable, is_substitution_consistent, trail))
+    start += 1
+  while len(frames) != 0:
+    start, variable, is_substitution_consistent, trail = frames.pop()
+    if trail is None:
+      solution = solve_equation(constraints[start]).merge(solution)
+      continue
+    for (i, constraint) in trail:
+      constraints[i] = constraint
+    if not is_substitution_consistent:
+      solution = solution.merge(Solution(inconsistencies={variable}))
+    if solution.is_inconsistent:
+      inconsistencies = set()
+      for i in range(start, len(constraints)):
+        variables = collect_variables(constraints[i])
+        if not solution.inconsistencies.isdisjoint(variables):
+          inconsistencies |= variables
+      if len(inconsistencies) != 0:
+        solution = solution.merge(Solution(inconsistencies=inconsistencies))
+        continue
+    top_constraint = constraints[start]
+    substitutions = {}
+    for term in collect_variables(top_constraint) & \
+        solution.assignments.keys():
+      substitutions[term] = LiteralExpression(solution.assignments[term])
+    top_constraint = substitute_all(substitutions, top_constraint)
+    solution = solution.merge(solve_equation(top_constraint))
+  return solution
+
+
+from library.linear_solver import *
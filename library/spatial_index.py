@@ -0,0 +1,72 @@
+import math
+
+
+class SpatialIndex:
+  '''
+  Implements a static R-tree over rectangles, packed bottom up using the
+  Sort-Tile-Recursive algorithm so that every node but the last of each level
+  is full. Rectangles are given by their top, left, bottom and right
+  coordinates, all inclusive.
+  '''
+
+  def __init__(self, entries, capacity = 16):
+    '''
+    Constructs a SpatialIndex.
+
+    Arguments:
+      entries - A list of tuples (top, left, bottom, right, value).
+      capacity - The maximum number of children of a node.
+    '''
+    self._capacity = capacity
+    self._size = len(entries)
+    level = [(top, left, bottom, right, value, True)
+      for (top, left, bottom, right, value) in entries]
+    while len(level) > capacity:
+      level = self._pack(level)
+    if len(level) == 0:
+      self._root = None
+    else:
+      self._root = self._make_node(level)
+
+  def query_point(self, x, y):
+    '''Returns the values of all rectangles containing a point.'''
+    return self.query_rect(y, x, y, x)
+
+  def query_rect(self, top, left, bottom, right):
+    '''Returns the values of all rectangles intersecting a rectangle.'''
+    values = []
+    if self._root is None:
+      return values
+    pending = [self._root]
+    while len(pending) != 0:
+      node = pending.pop()
+      for child in node[4]:
+        if child[0] <= bottom and child[2] >= top and child[1] <= right and \
+            child[3] >= left:
+          if child[5]:
+            values.append(child[4])
+          else:
+            pending.append(child)
+    return values
+
+  def _pack(self, level):
+    '''Groups a level of nodes into the level of nodes above it.'''
+    count = math.ceil(len(level) / self._capacity)
+    slice_count = math.ceil(math.sqrt(count))
+    slice_size = slice_count * self._capacity
+    level = sorted(level, key=lambda node: node[1] + node[3])
+    parents = []
+    for i in range(0, len(level), slice_size):
+      tile = sorted(level[i:i + slice_size], key=lambda node: node[0] + node[2])
+      for j in range(0, len(tile), self._capacity):
+        parents.append(self._make_node(tile[j:j + self._capacity]))
+    return parents
+
+  @staticmethod
+  def _make_node(children):
+    return (min(child[0] for child in children),
+      min(child[1] for child in children), max(child[2] for child in children),
+      max(child[3] for child in children), children, False)
+
+  def __len__(self):
+    return self._size
@@ -2,6 +2,7 @@ class Statement:
   '''
   Base class representing a statement. A statement is any valid syntactic form.
   '''
+  __slots__ = ()
 
   def visit(self, visitor):
     '''Applies a visitor to this Statement.'''
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+from library.layout import Layout
+from library.parser import parse
+from library.version import VERSION
+
+
+CACHE_ENTRY_EXTENSION = '.entry'
+CACHE_TEMPORARY_EXTENSION = '.tmp'
+CACHE_TEMPORARY_LIFETIME = 60 * 60
+
+
+class SystemCache:
+  '''
+  A persistent cache of artifacts derived from source text, such as parsed
+  ConstraintSystems and compiled Layouts, held in a directory that may be
+  shared by concurrent processes. Entries are keyed by a SHA-256 digest of
+  the library version, the kind of artifact and the source. Entries are
+  written to a temporary file and renamed into place so that readers never
+  observe a partial entry, and once the directory exceeds its size the least
+  recently used entries are removed. Entries that can not be loaded, such as
+  those written by an incompatible build, are treated as missing and replaced.
+  Temporary files left behind by writers that did not finish count towards
+  the size and are removed once they are older than CACHE_TEMPORARY_LIFETIME
+  seconds.
+  '''
+  def __init__(self, directory, size = 256 * 1024 * 1024):
+    '''
+    Constructs a SystemCache.
+
+    Arguments:
+      directory - The directory holding the entries, created if needed.
+      size - The maximum total size in bytes of the entries.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    self._directory = directory
+    self._size = size
+    self._hits = 0
+    self._misses = 0
+
+  @property
+  def directory(self):
+    '''Returns the directory holding the entries.'''
+    return self._directory
+
+  @property
+  def size(self):
+    '''Returns the maximum total size in bytes of the entries.'''
+    return self._size
+
+  @property
+  def hits(self):
+    '''Returns the number of lookups that found an entry.'''
+    return self._hits
+
+  @property
+  def misses(self):
+    '''Returns the number of lookups that did not find an entry.'''
+    return self._misses
+
+  def get_path(self, source, kind):
+    '''Returns the path of the entry for a kind of artifact of a source.'''
+    digest = hashlib.sha256()
+    digest.update(VERSION.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(kind.encode('utf-8'))
+    digest.update(b'\0')
+    if isinstance(source, str):
+      source = source.encode('utf-8')
+    digest.update(source)
+    return os.path.join(
+      self._directory, digest.hexdigest() + CACHE_ENTRY_EXTENSION)
+
+  def lookup(self, source, kind):
+    '''
+    Returns a tuple (is_found, artifact) for the artifact of a kind stored
+    for a source.
+    '''
+    path = self.get_path(source, kind)
+    try:
+      with open(path, 'rb') as file:
+        artifact = pickle.load(file)
+    except Exception as error:
+      if not isinstance(error, FileNotFoundError):
+        self._remove(path)
+      self._misses += 1
+      return False, None
+    self._touch(path)
+    self._hits += 1
+    return True, artifact
+
+  def store(self, source, kind, artifact):
+    '''Stores the artifact of a kind for a source.'''
+    def write(path):
+      with open(path, 'wb') as file:
+        pickle.dump(artifact, file, pickle.HIGHEST_PROTOCOL)
+    self._write(self.get_path(source, kind), write)
+
+  def get(self, source, kind, build):
+    '''
+    Returns the artifact of a kind stored for a source, or the result of
+    calling build with the source, which is then stored.
+    '''
+    is_found, artifact = self.lookup(source, kind)
+    if not is_found:
+      artifact = build(source)
+      self.store(source, kind, artifact)
+    return artifact
+
+  def parse(self, source, linear = False):
+    '''Returns the ConstraintSystem parsed from a source, see parse.'''
+    if linear:
+      kind = 'linear system'
+    else:
+      kind = 'system'
+    return self.get(source, kind, lambda source: parse(source, linear))
+
+  def get_layout(self, source, build):
+    '''
+    Returns the Layout stored for a source, or the Layout returned by calling
+    build with the source, which is then stored along with its span systems
+    and parametric solution using Layout.save_compiled. Stored Layouts are
+    loaded with Layout.load_compiled.
+    '''
+    path = self.get_path(source, 'layout')
+    try:
+      layout = Layout.load_compiled(path)
+    except Exception as error:
+      if not isinstance(error, FileNotFoundError):
+        self._remove(path)
+      self._misses += 1
+      layout = build(source)
+      self._write(path, layout.save_compiled)
+      return layout
+    self._touch(path)
+    self._hits += 1
+    return layout
+
+  def clear(self):
+    '''Removes every entry.'''
+    for entry in self._list_entries():
+      self._remove(entry.path)
+
+  def _touch(self, path):
+    try:
+      os.utime(path)
+    except OSError:
+      pass
+
+  def _remove(self, path):
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+  def _list_entries(self):
+    return [entry for entry in os.scandir(self._directory)
+      if entry.name.endswith(CACHE_ENTRY_EXTENSION) and entry.is_file()]
+
+  def _write(self, path, write):
+    descriptor, temporary_path = tempfile.mkstemp(
+      dir=self._directory, prefix='.', suffix=CACHE_TEMPORARY_EXTENSION)
+    os.close(descriptor)
+    try:
+      write(temporary_path)
+      os.replace(temporary_path, path)
+    except BaseException:
+      self._remove(temporary_path)
+      raise
+    self._evict()
+
+  def _evict(self):
+    entries = []
+    total = 0
+    for entry in self._list_entries():
+      try:
+        status = entry.stat()
+      except OSError:
+        continue
+      entries.append((status.st_mtime, entry.path, status.st_size))
+      total += status.st_size
+    expiry = time.time() - CACHE_TEMPORARY_LIFETIME
+    for entry in os.scandir(self._directory):
+      if not entry.name.startswith('.') or \
+          not entry.name.endswith(CACHE_TEMPORARY_EXTENSION):
+        continue
+      try:
+        status = entry.stat()
+      except OSError:
+        continue
+      if status.st_mtime < expiry:
+        self._remove(entry.path)
+      else:
+        total += status.st_size
+    entries.sort()
+    for (mtime, path, size) in entries:
+      if total <= self._size:
+        break
+      self._remove(path)
+      total -= size
@@ -1,6 +1,12 @@
 import enum
 
-from library import StatementVisitor
+from library import AdditionExpression
+from library import DivisionExpression
+from library import LiteralExpression
+from library import MultiplicationExpression
+from library import SubtractionExpression
+from library import VariableExpression
+from library.traversal import *
 
 
 class SystemCategory:
@@ -27,55 +33,57 @@ class SystemCategory:
     return f'({self._type.name} {self._variables})'
 
 
-def categorize(expression):
-  class Visitor(StatementVisitor):
-    def visit_addition(self, expression):
-      left_category = categorize(expression.left)
-      right_category = categorize(expression.right)
-      if right_category.type < left_category.type:
-        tmp = left_category
-        left_category = right_category
-        right_category = tmp
-      if left_category.type == SystemCategory.Type.CONSTANT:
-        if right_category.type == SystemCategory.Type.MONOMIAL:
-          return SystemCategory(
-            SystemCategory.Type.LINEAR, right_category.variables)
-      elif left_category.type == SystemCategory.Type.MONOMIAL:
-        if right_category.type == SystemCategory.Type.MONOMIAL:
-          if right_category.variables == left_category.variables:
-            return SystemCategory(
-              SystemCategory.Type.MONOMIAL, left_category.variables)
-          else:
-            return SystemCategory(SystemCategory.Type.LINEAR,
-              left_category.variables | right_category.variables)
-      return SystemCategory(right_category.type,
-        left_category.variables | right_category.variables)
+def categorize_addition(expression, left_category, right_category):
+  if right_category.type < left_category.type:
+    tmp = left_category
+    left_category = right_category
+    right_category = tmp
+  if left_category.type == SystemCategory.Type.CONSTANT:
+    if right_category.type == SystemCategory.Type.MONOMIAL:
+      return SystemCategory(
+        SystemCategory.Type.LINEAR, right_category.variables)
+  elif left_category.type == SystemCategory.Type.MONOMIAL:
+    if right_category.type == SystemCategory.Type.MONOMIAL:
+      if right_category.variables == left_category.variables:
+        return SystemCategory(
+          SystemCategory.Type.MONOMIAL, left_category.variables)
+      else:
+        return SystemCategory(SystemCategory.Type.LINEAR,
+          left_category.variables | right_category.variables)
+  return SystemCategory(right_category.type,
+    left_category.variables | right_category.variables)
 
-    def visit_subtraction(self, expression):
-      return self.visit_addition(expression)
-
-    def visit_multiplication(self, expression):
-      left_category = categorize(expression.left)
-      right_category = categorize(expression.right)
-      if right_category.type < left_category.type:
-        tmp = left_category
-        left_category = right_category
-        right_category = tmp
-      if left_category.type == SystemCategory.Type.CONSTANT:
-        return right_category
-      elif left_category.type == SystemCategory.Type.MONOMIAL:
-        if right_category.type == SystemCategory.Type.MONOMIAL:
-          return SystemCategory(SystemCategory.Type.MONOMIAL,
-            left_category.variables | right_category.variables)
-      return SystemCategory(SystemCategory.Type.POLYNOMIAL,
+
+def categorize_multiplication(expression, left_category, right_category):
+  if right_category.type < left_category.type:
+    tmp = left_category
+    left_category = right_category
+    right_category = tmp
+  if left_category.type == SystemCategory.Type.CONSTANT:
+    return right_category
+  elif left_category.type == SystemCategory.Type.MONOMIAL:
+    if right_category.type == SystemCategory.Type.MONOMIAL:
+      return SystemCategory(SystemCategory.Type.MONOMIAL,
         left_category.variables | right_category.variables)
+  return SystemCategory(SystemCategory.Type.POLYNOMIAL,
+    left_category.variables | right_category.variables)
+
 
-    def visit_division(self, expression):
-      raise RuntimeError('Not supported.')
+def categorize_division(expression, left_category, right_category):
+  raise RuntimeError('Not supported.')
 
-    def visit_literal(self, expression):
-      return SystemCategory(SystemCategory.Type.CONSTANT, set())
 
-    def visit_variable(self, expression):
-      return SystemCategory(SystemCategory.Type.MONOMIAL, {expression.name})
-  return expression.visit(Visitor())
+CATEGORIZATION_RULES = {
+  AdditionExpression: categorize_addition,
+  SubtractionExpression: categorize_addition,
+  MultiplicationExpression: categorize_multiplication,
+  DivisionExpression: categorize_division,
+  LiteralExpression:
+    lambda expression: SystemCategory(SystemCategory.Type.CONSTANT, set()),
+  VariableExpression: lambda expression:
+    SystemCategory(SystemCategory.Type.MONOMIAL, {expression.name})
+}
+
+
+def categorize(expression):
+  return transform_post_order(expression, CATEGORIZATION_RULES)
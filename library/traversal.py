@@ -0,0 +1,140 @@
+from library.addition_expression import AdditionExpression
+from library.constraint_system import ConstraintSystem
+from library.division_expression import DivisionExpression
+from library.equation import Equation
+from library.multiplication_expression import MultiplicationExpression
+from library.subtraction_expression import SubtractionExpression
+
+
+CHILDREN = {
+  AdditionExpression: lambda statement: (statement.left, statement.right),
+  SubtractionExpression: lambda statement: (statement.left, statement.right),
+  MultiplicationExpression:
+    lambda statement: (statement.left, statement.right),
+  DivisionExpression: lambda statement: (statement.left, statement.right),
+  Equation: lambda statement: (statement.expression,),
+  ConstraintSystem: lambda statement: statement.constraints
+}
+
+REBUILDERS = {
+  AdditionExpression: lambda statement, children: AdditionExpression(*children),
+  SubtractionExpression:
+    lambda statement, children: SubtractionExpression(*children),
+  MultiplicationExpression:
+    lambda statement, children: MultiplicationExpression(*children),
+  DivisionExpression: lambda statement, children: DivisionExpression(*children),
+  Equation: lambda statement, children: Equation(*children),
+  ConstraintSystem: lambda statement, children: ConstraintSystem(children)
+}
+
+
+def lookup(table, kind):
+  '''
+  Returns the entry of a table keyed by Statement classes for a class or its
+  nearest base class, or None if there is no such entry.
+  '''
+  entry = table.get(kind)
+  if entry is not None:
+    return entry
+  for base in kind.__mro__[1:]:
+    entry = table.get(base)
+    if entry is not None:
+      return entry
+  return None
+
+
+def get_children(statement):
+  '''Returns the sequence of a Statement's immediate sub-statements.'''
+  children = lookup(CHILDREN, type(statement))
+  if children is None:
+    return ()
+  return children(statement)
+
+
+def rebuild(statement, children, transformed_children):
+  '''
+  Returns a statement with its children replaced by transformed children, or
+  the statement itself if every transformed child is the original child.
+  '''
+  for (child, transformed_child) in zip(children, transformed_children):
+    if child is not transformed_child:
+      return lookup(REBUILDERS, type(statement))(
+        statement, transformed_children)
+  return statement
+
+
+def iterate_pre_order(statement):
+  '''Yields a statement and all of its sub-statements in pre-order.'''
+  pending = [statement]
+  while len(pending) != 0:
+    node = pending.pop()
+    yield node
+    children = get_children(node)
+    for i in range(len(children) - 1, -1, -1):
+      pending.append(children[i])
+
+
+def transform_post_order(statement, table):
+  '''
+  Transforms a statement bottom up. The table maps Statement classes to
+  functions taking a node followed by the transformations of its children and
+  returning the node's transformation. Nodes without an entry are rebuilt from
+  their transformed children. Traversal uses an explicit stack so the depth of
+  the statement is not limited by Python's recursion limit.
+  '''
+  values = []
+  pending = [(statement, None)]
+  while len(pending) != 0:
+    node, children = pending.pop()
+    if children is None:
+      children = get_children(node)
+      if len(children) != 0:
+        pending.append((node, children))
+        for i in range(len(children) - 1, -1, -1):
+          pending.append((children[i], None))
+        continue
+    count = len(children)
+    if count == 0:
+      arguments = ()
+    else:
+      arguments = values[-count:]
+      del values[-count:]
+    function = lookup(table, type(node))
+    if function is None:
+      values.append(rebuild(node, children, arguments))
+    else:
+      values.append(function(node, *arguments))
+  return values[0]
+
+
+def transform_pre_order(statement, table):
+  '''
+  Transforms a statement top down. The table maps Statement classes to
+  functions taking a node and returning its replacement, or None to transform
+  its children instead and rebuild it from them. Nodes without an entry are
+  rebuilt from their transformed children.
+  '''
+  values = []
+  pending = [(statement, None)]
+  while len(pending) != 0:
+    node, children = pending.pop()
+    if children is None:
+      function = lookup(table, type(node))
+      if function is not None:
+        replacement = function(node)
+        if replacement is not None:
+          values.append(replacement)
+          continue
+      children = get_children(node)
+      if len(children) == 0:
+        values.append(node)
+        continue
+      pending.append((node, children))
+      for i in range(len(children) - 1, -1, -1):
+        pending.append((children[i], None))
+      continue
+    count = len(children)
+    arguments = values[-count:]
+    del values[-count:]
+    values.append(rebuild(node, children, arguments))
+  return values[0]
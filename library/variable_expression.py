@@ -3,11 +3,12 @@ from library.expression import *
 
 class VariableExpression(Expression):
   '''Implements an Expression representing a variable.'''
+  __slots__ = ('_name',)
 
   def __init__(self, name):
     '''Constructs a VariableExpression with a given name.'''
     super().__init__()
-    self._name = name
+    object.__setattr__(self, '_name', name)
 
   @property
   def name(self):
@@ -17,8 +18,16 @@ class VariableExpression(Expression):
   def visit(self, visitor):
     return visitor.visit_variable(self)
 
+  def _matches(self, name):
+    return self._name == name
+
+  def __reduce__(self):
+    return (VariableExpression, (self._name,))
+
   def __eq__(self, right):
-    return isinstance(right, VariableExpression) and self._name == right._name
+    return self is right
+
+  __hash__ = Expression.__hash__
 
   def __str__(self):
     return self._name
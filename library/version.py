@@ -0,0 +1,6 @@
+'''
+The version of the library, which must change whenever the pickled form of a
+Statement or the output of parsing, solving or compiling changes, since
+persistent caches are keyed on it.
+'''
+VERSION = '1.0.0'
@@ -0,0 +1,83 @@
+import unittest
+
+from library import *
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+a = VariableExpression('a')
+x = VariableExpression('x')
+y = VariableExpression('y')
+
+
+class CompilerTester(unittest.TestCase):
+  def test_compile_literal(self):
+    self.assertEqual(compile_statement(LiteralExpression(5))({}), 5)
+
+  def test_compile_expression(self):
+    expression = (x + 2) * (y - x) / 4 - (x + 2)
+    compiled = compile_statement(expression)
+    for (u, v) in [(1, 2), (3, -5), (0.5, 0.25)]:
+      substitution = substitute_all(
+        {'x': LiteralExpression(u), 'y': LiteralExpression(v)}, expression)
+      self.assertAlmostEqual(compiled({'x': u, 'y': v}), evaluate(substitution))
+
+  def test_compile_division_by_zero(self):
+    compiled = compile_statement(x / (y - 1) + 1)
+    self.assertEqual(compiled({'x': 2, 'y': 3}), 2)
+    self.assertIs(compiled({'x': 2, 'y': 1}), UNDERDETERMINED)
+
+  def test_compile_equation(self):
+    compiled = compile_statement(Equation(2 * x - 6))
+    self.assertEqual(compiled({'x': 3}), 0)
+    self.assertEqual(compiled({'x': 4}), 2)
+
+  def test_compile_constraint_system(self):
+    system = ConstraintSystem(
+      [Equation(x + y - 1), Equation(a / x), Equation(x - y)])
+    compiled = compile_statement(system)
+    self.assertEqual(
+      compiled({'x': 0, 'y': 1, 'a': 3}), [0, UNDERDETERMINED, -1])
+
+  def test_compile_deep_expression(self):
+    expression = x
+    for i in range(5000):
+      expression = expression + 1
+    compiled = compile_statement(expression)
+    self.assertEqual(compiled({'x': 1}), 5001)
+
+  def test_unbound_variable(self):
+    self.assertRaises(KeyError, compile_statement(x + y), {'x': 1})
+
+  @unittest.skipIf(numpy is None, 'NumPy is not installed.')
+  def test_vectorized_expression(self):
+    expression = (x + 2) * y / (x - 1)
+    xs = numpy.array([0.0, 1.0, 2.0, 3.0])
+    result = compile_vectorized(expression)({'x': xs, 'y': 2})
+    self.assertTrue(numpy.allclose(result[[0, 2, 3]], [-4, 8, 5]))
+    self.assertTrue(numpy.isnan(result[1]))
+
+  @unittest.skipIf(numpy is None, 'NumPy is not installed.')
+  def test_vectorized_constraint_system(self):
+    system = ConstraintSystem([Equation(x - y), Equation(a / (x - y))])
+    xs = numpy.array([1.0, 2.0])
+    residuals = compile_vectorized(system)({'x': xs, 'y': 1, 'a': 4})
+    self.assertTrue(numpy.allclose(residuals[0], [0, 1]))
+    self.assertTrue(numpy.isnan(residuals[1][0]))
+    self.assertEqual(residuals[1][1], 4)
+
+  @unittest.skipIf(numpy is None, 'NumPy is not installed.')
+  def test_vectorized_solution(self):
+    solution = Solution({'y': 3}, underdetermined={'a'})
+    xs = numpy.arange(3.0)
+    result = evaluate_vectorized(x * y, {'x': xs}, solution)
+    self.assertTrue(numpy.allclose(result, [0, 3, 6]))
+    result = evaluate_vectorized(x + a, {'x': xs}, solution)
+    self.assertTrue(numpy.isnan(result).all())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,4 +1,7 @@
+import os
+import tempfile
 import unittest
+import unittest.mock
 
 from library import *
 
@@ -7,20 +10,20 @@ class LayoutTester(unittest.TestCase):
   def test_single_fixed_solution(self):
     a = LayoutItem('A', 0, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
     layout = Layout([a], [])
-    self.assertEqual(layout.items, [a])
+    self.assertSequenceEqual(layout.items, [a])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 100)
     layout.resize(200, 100)
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 100)
-    self.assertEqual(layout.items, [a])
+    self.assertSequenceEqual(layout.items, [a])
 
   def test_single_horizontal_expanding_solution(self):
     a = LayoutItem(
       'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
     layout = Layout([a], [])
-    self.assertEqual(layout.items, [a])
+    self.assertSequenceEqual(layout.items, [a])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 100)
@@ -28,25 +31,25 @@ class LayoutTester(unittest.TestCase):
     self.assertEqual(layout.width, 200)
     self.assertEqual(layout.height, 100)
     a.width = 200
-    self.assertEqual(layout.items, [a])
+    self.assertSequenceEqual(layout.items, [a])
 
   def test_double_fixed_solution(self):
     a = LayoutItem('A', 0, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
     b = LayoutItem(
       'B', 0, 100, 200, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
     layout = Layout([a, b], [])
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 300)
     self.assertEqual(layout.height, 100)
     layout.resize(200, 100)
     self.assertEqual(layout.width, 300)
     self.assertEqual(layout.height, 100)
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
     layout.resize(600, 100)
     self.assertEqual(layout.width, 300)
     self.assertEqual(layout.height, 100)
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
 
   def test_double_expanding_solution(self):
     a = LayoutItem(
@@ -54,7 +57,7 @@ class LayoutTester(unittest.TestCase):
     b = LayoutItem(
       'B', 0, 100, 200, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
     layout = Layout([a, b], [])
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 300)
     self.assertEqual(layout.height, 100)
@@ -64,7 +67,7 @@ class LayoutTester(unittest.TestCase):
     a.width = 200
     b.left = 200
     b.width = 300
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
 
   def test_mixed_row(self):
     a = LayoutItem(
@@ -74,7 +77,7 @@ class LayoutTester(unittest.TestCase):
     c = LayoutItem(
       'C', 0, 300, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
     layout = Layout([a, b, c], [])
-    self.assertEqual(layout.items, [a, b, c])
+    self.assertSequenceEqual(layout.items, [a, b, c])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 400)
     self.assertEqual(layout.height, 100)
@@ -85,21 +88,21 @@ class LayoutTester(unittest.TestCase):
     b.left = 150
     c.width = 150
     c.left = 350
-    self.assertEqual(layout.items, [a, b, c])
+    self.assertSequenceEqual(layout.items, [a, b, c])
 
   def test_two_fixed_rows(self):
     a = LayoutItem('A', 0, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
     b = LayoutItem(
       'B', 100, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
     layout = Layout([a, b], [])
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 200)
     layout.resize(200, 100)
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 200)
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
 
   def test_two_expanding_rows(self):
     a = LayoutItem(
@@ -107,7 +110,7 @@ class LayoutTester(unittest.TestCase):
     b = LayoutItem(
       'B', 100, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
     layout = Layout([a, b], [])
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 200)
@@ -116,7 +119,7 @@ class LayoutTester(unittest.TestCase):
     self.assertEqual(layout.height, 200)
     a.width = 200
     b.width = 200
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
 
   def test_two_mixed_rows(self):
     a = LayoutItem(
@@ -124,14 +127,14 @@ class LayoutTester(unittest.TestCase):
     b = LayoutItem(
       'B', 100, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
     layout = Layout([a, b], [])
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 200)
     layout.resize(200, 100)
     self.assertEqual(layout.width, 100)
     self.assertEqual(layout.height, 200)
-    self.assertEqual(layout.items, [a, b])
+    self.assertSequenceEqual(layout.items, [a, b])
 
   def test_row_decomposition(self):
     a = LayoutItem(
@@ -143,7 +146,7 @@ class LayoutTester(unittest.TestCase):
     d = LayoutItem(
       'D', 75, 100, 200, LayoutPolicy.FIXED, 25, LayoutPolicy.FIXED)
     layout = Layout([a, b, c, d], [])
-    self.assertEqual(layout.items, [a, b, c, d])
+    self.assertSequenceEqual(layout.items, [a, b, c, d])
     self.assertEqual(layout.constraints, [])
     self.assertEqual(layout.width, 400)
     self.assertEqual(layout.height, 100)
@@ -155,7 +158,277 @@ class LayoutTester(unittest.TestCase):
     c.width = 150
     c.left = 350
     d.left = 150
-    self.assertEqual(layout.items, [a, b, c, d])
+    self.assertSequenceEqual(layout.items, [a, b, c, d])
+
+  def test_repeated_resize(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.EXPANDING)
+    b = LayoutItem(
+      'B', 0, 100, 200, LayoutPolicy.FIXED, 100, LayoutPolicy.EXPANDING)
+    c = LayoutItem(
+      'C', 100, 0, 300, LayoutPolicy.EXPANDING, 50, LayoutPolicy.FIXED)
+    layout = Layout([a, b, c], [])
+    for (width, height) in [(500, 300), (400, 200), (600, 150), (300, 150)]:
+      layout.resize(width, height)
+      expected = Layout([a, b, c], [])
+      expected.resize(width, height)
+      self.assertEqual(layout.width, expected.width)
+      self.assertEqual(layout.height, expected.height)
+      self.assertEqual(layout.items, expected.items)
+    layout.resize(700, 100)
+    self.assertEqual(layout.width, 700)
+    self.assertEqual(layout.height, 100)
+    a.width = 500
+    b.left = 500
+    c.width = 700
+    a.height = 50
+    b.height = 50
+    c.top = 50
+    self.assertSequenceEqual(layout.items, [a, b, c])
+
+  def test_invalidate(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
+    b = LayoutItem(
+      'B', 0, 100, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
+    layout = Layout([a, b], [])
+    layout.resize(300, 100)
+    self.assertEqual(layout.items[0].width, 200)
+    layout.resize(200, 100)
+    self.assertEqual(layout.items[0].width, 100)
+    layout.items[0].width_policy = LayoutPolicy.FIXED
+    layout.items[1].width_policy = LayoutPolicy.EXPANDING
+    layout.invalidate()
+    layout.resize(300, 100)
+    self.assertEqual(layout.items[0].width, 100)
+    self.assertEqual(layout.items[1].width, 200)
+
+  def test_resize_many(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
+    b = LayoutItem(
+      'B', 0, 100, 200, LayoutPolicy.FIXED, 100, LayoutPolicy.EXPANDING)
+    layout = Layout([a, b], [])
+    sizes = [(400, 100), (500, 200), (300, 50)]
+    geometry = layout.resize_many(sizes)
+    self.assertEqual(len(geometry), 3)
+    self.assertEqual(geometry.names, ['A', 'B'])
+    self.assertEqual(list(geometry.width), [400, 500, 300])
+    self.assertEqual(list(geometry.height), [100, 100, 100])
+    self.assertSequenceEqual(layout.items, [a, b])
+    for (i, (width, height)) in enumerate(sizes):
+      expected = Layout([a, b], [])
+      expected.resize(width, height)
+      for item in expected.items:
+        top, left, width, height = geometry.get_item(item.name)
+        self.assertEqual(
+          (top[i], left[i], width[i], height[i]),
+          (item.top, item.left, item.width, item.height))
+
+  def test_sparse_spans(self):
+    a = LayoutItem('A', 0, 0, 10, LayoutPolicy.FIXED, 1, LayoutPolicy.FIXED)
+    b = LayoutItem(
+      'B', 1000000, 0, 10, LayoutPolicy.FIXED, 1, LayoutPolicy.FIXED)
+    system = build_span_system([a, b], 10, 1000001, Direction.HORIZONTAL)
+    self.assertEqual(system, ConstraintSystem([
+      Equation(VariableExpression('A.left')),
+      Equation(VariableExpression('A.width') - 10),
+      Equation(VariableExpression('A.width') - VariableExpression('width')),
+      Equation(VariableExpression('B.left')),
+      Equation(VariableExpression('B.width') - 10),
+      Equation(VariableExpression('B.width') - VariableExpression('width'))]))
+
+  def test_vertical_expanding_solution(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.EXPANDING)
+    layout = Layout([a], [])
+    layout.resize(100, 250)
+    self.assertEqual(layout.width, 100)
+    self.assertEqual(layout.height, 250)
+    a.height = 250
+    self.assertSequenceEqual(layout.items, [a])
+
+  def test_hit_testing(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
+    b = LayoutItem(
+      'B', 0, 100, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
+    c = LayoutItem(
+      'C', 100, 0, 200, LayoutPolicy.EXPANDING, 50, LayoutPolicy.FIXED)
+    layout = Layout([a, b, c], [])
+    self.assertEqual(layout.items_at(50, 50), [a])
+    self.assertEqual(layout.items_at(100, 99), [b])
+    self.assertEqual(layout.items_at(150, 120), [c])
+    self.assertEqual(layout.items_at(250, 50), [])
+    self.assertEqual(layout.items_in((50, 50, 100, 100)), [a, b, c])
+    self.assertEqual(layout.items_in((0, 150, 10, 10)), [b])
+    layout.resize(300, 150)
+    self.assertEqual(layout.items_at(150, 50), [layout.items[0]])
+    self.assertEqual(layout.items_at(250, 50), [layout.items[1]])
+    self.assertEqual(layout.items_at(250, 120), [layout.items[2]])
+
+  def test_editing(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
+    b = LayoutItem(
+      'B', 0, 100, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
+    c = LayoutItem(
+      'C', 100, 0, 200, LayoutPolicy.EXPANDING, 100, LayoutPolicy.EXPANDING)
+    layout = Layout([a, b], [])
+    layout.resize(300, 100)
+    items = layout.items
+    self.assertIsInstance(items, tuple)
+    self.assertIs(layout.items, items)
+    layout.set_policy('B', LayoutPolicy.EXPANDING, LayoutPolicy.FIXED)
+    layout.resize(400, 100)
+    a.width = 250
+    b.left = 250
+    b.width = 150
+    b.width_policy = LayoutPolicy.EXPANDING
+    self.assertSequenceEqual(layout.items, [a, b])
+    c.width = 400
+    layout.add_item(c)
+    self.assertEqual(len(items), 2)
+    self.assertEqual(len(layout.items), 3)
+    self.assertRaises(RuntimeError, layout.add_item, c)
+    self.assertEqual(layout.height, 200)
+    layout.resize(400, 300)
+    c.height = 200
+    self.assertSequenceEqual(layout.items, [a, b, c])
+    layout.move_item('A', 0, 150)
+    layout.move_item('B', 0, 0)
+    layout.resize(500, 300)
+    a.left = 200
+    a.width = 300
+    b.left = 0
+    b.width = 200
+    c.width = 500
+    self.assertSequenceEqual(layout.items, [b, a, c])
+    layout.remove_item('C')
+    self.assertRaises(RuntimeError, layout.remove_item, 'C')
+    self.assertEqual(layout.items_at(50, 150), [])
+    layout.resize(500, 300)
+    self.assertEqual(layout.height, 100)
+    self.assertSequenceEqual(layout.items, [b, a])
+
+  def test_editing_after_resize(self):
+    items = [LayoutItem(f'{row}{column}', 100 * row, 100 * column, 100,
+      LayoutPolicy.EXPANDING, 100, LayoutPolicy.EXPANDING)
+      for row in range(3) for column in range(2)]
+    layout = Layout(items, [])
+    with unittest.mock.patch('library.layout.solve_parametric',
+        wraps=solve_parametric) as solver:
+      layout.resize(200, 300)
+      self.assertEqual(solver.call_count, 5)
+      layout.resize(400, 600)
+      self.assertEqual(solver.call_count, 5)
+      layout.set_policy('11', LayoutPolicy.FIXED, LayoutPolicy.EXPANDING)
+      layout.resize(400, 600)
+      self.assertEqual(solver.call_count, 6)
+      layout.set_policy('20', LayoutPolicy.FIXED, LayoutPolicy.EXPANDING)
+      layout.resize(400, 600)
+      self.assertEqual(solver.call_count, 7)
+    expected = Layout([LayoutItem(item.name, item.top, item.left, item.width,
+      item.width_policy, item.height, item.height_policy)
+      for item in layout.items], [])
+    def get_geometry(layout):
+      return [(item.name, round(item.top, SPAN_PRECISION),
+        round(item.left, SPAN_PRECISION), round(item.width, SPAN_PRECISION),
+        round(item.height, SPAN_PRECISION)) for item in layout.items]
+    for (width, height) in [(400, 600), (500, 700), (800, 900)]:
+      layout.resize(width, height)
+      expected.resize(width, height)
+      self.assertEqual(get_geometry(layout), get_geometry(expected))
+
+  def test_resize_diff(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.FIXED, 100, LayoutPolicy.FIXED)
+    b = LayoutItem(
+      'B', 0, 100, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
+    c = LayoutItem(
+      'C', 100, 0, 200, LayoutPolicy.EXPANDING, 50, LayoutPolicy.FIXED)
+    layout = Layout([a, b, c], [])
+    changes = layout.resize(200, 150, diff=True)
+    self.assertEqual(changes, [])
+    changes = layout.resize(300, 150, diff=True)
+    changes.sort(key=lambda change: change[0].name)
+    self.assertEqual(len(changes), 2)
+    self.assertEqual(changes[0],
+      (layout.items[1], (0, 100, 100, 100), (0, 100, 200, 100)))
+    self.assertEqual(changes[1],
+      (layout.items[2], (100, 0, 200, 50), (100, 0, 300, 50)))
+    self.assertIsNone(layout.resize(300, 150))
+    self.assertIs(type(layout.width), float)
+    self.assertIs(type(layout.height), float)
+    layout.resize(400, 150)
+    self.assertEqual((layout.width, layout.height), (400, 150))
+    self.assertIs(type(layout.width), float)
+    with unittest.mock.patch.object(
+        Layout, '_get_parametric_solution', return_value=None):
+      layout.resize(500, 150)
+    self.assertEqual((layout.width, layout.height), (500, 150))
+    self.assertIs(type(layout.width), float)
+    self.assertIs(type(layout.height), float)
+    self.assertIs(type(Layout([], []).width), float)
+
+  def test_item_store(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.FIXED)
+    b = LayoutItem('B', 0, 100, 50)
+    store = ItemStore([a, b])
+    self.assertEqual(len(store), 2)
+    self.assertEqual(store.views, [a, b])
+    view = store.find('A')
+    self.assertIsNot(view, a)
+    view.width = 200
+    view.height_policy = LayoutPolicy.EXPANDING
+    self.assertEqual(a.width, 100)
+    self.assertEqual(store.find('A').width, 200)
+    self.assertEqual(store.find('A').height_policy, LayoutPolicy.EXPANDING)
+    self.assertFalse(hasattr(view, '__dict__'))
+    store.remove('A')
+    self.assertEqual(len(store), 1)
+    self.assertIsNone(store.find('A'))
+    self.assertEqual(store.find('B'), b)
+    view.width = 300
+    self.assertEqual(view.width, 300)
+    self.assertEqual(store.find('B').width, 50)
+
+  def test_compiled_layout(self):
+    a = LayoutItem(
+      'A', 0, 0, 100, LayoutPolicy.EXPANDING, 100, LayoutPolicy.EXPANDING)
+    b = LayoutItem(
+      'B', 0, 100, 200, LayoutPolicy.FIXED, 100, LayoutPolicy.EXPANDING)
+    c = LayoutItem(
+      'C', 100, 0, 300, LayoutPolicy.EXPANDING, 50, LayoutPolicy.FIXED)
+    layout = Layout([c, a, b], [Equation(VariableExpression('A.width'))])
+    layout.resize(400, 200)
+    with tempfile.TemporaryDirectory() as directory:
+      path = os.path.join(directory, 'layout.bin')
+      layout.save_compiled(path)
+      compiled_layout = Layout.load_compiled(path)
+      with open(path, 'rb') as file:
+        contents = file.read()
+      with open(path, 'wb') as file:
+        file.write(contents[:-1])
+      self.assertRaises(RuntimeError, Layout.load_compiled, path)
+      with open(path, 'wb') as file:
+        file.write(b'layout')
+      self.assertRaises(RuntimeError, Layout.load_compiled, path)
+    self.assertEqual(compiled_layout._solve_size(400, 200),
+      layout._solve_size(400, 200))
+    self.assertEqual(compiled_layout.items, layout.items)
+    self.assertEqual(compiled_layout.constraints, layout.constraints)
+    self.assertEqual(compiled_layout.width, 400)
+    self.assertEqual(compiled_layout.height, 200)
+    for (width, height) in [(500, 300), (300, 150)]:
+      layout.resize(width, height)
+      compiled_layout.resize(width, height)
+      self.assertEqual(compiled_layout.items, layout.items)
+    compiled_layout.set_policy(
+      'B', LayoutPolicy.EXPANDING, LayoutPolicy.EXPANDING)
+    compiled_layout.resize(400, 150)
+    self.assertEqual(compiled_layout.items_at(350, 10)[0].width, 250)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+import unittest
+
+from library import *
+
+
+x = VariableExpression('x')
+y = VariableExpression('y')
+z = VariableExpression('z')
+
+
+class LinearFormTester(unittest.TestCase):
+  def test_from_literal(self):
+    form = LinearForm.from_expression(LiteralExpression(5))
+    self.assertEqual(form, LinearForm({}, 5))
+    self.assertTrue(form.is_constant)
+
+  def test_from_linear_expression(self):
+    form = LinearForm.from_expression(2 * (x - 3 * y) + y / 2 - 7)
+    self.assertEqual(form, LinearForm({'x': 2, 'y': -5.5}, -7))
+
+  def test_from_cancelling_expression(self):
+    form = LinearForm.from_expression(x + y - x)
+    self.assertEqual(form, LinearForm({'y': 1}))
+    self.assertEqual(form.coefficient('x'), 0)
+
+  def test_from_non_linear_expression(self):
+    self.assertIsNone(LinearForm.from_expression(x * y))
+    self.assertIsNone(LinearForm.from_expression(x / y))
+    self.assertIsNone(LinearForm.from_expression(x / (y - y)))
+
+  def test_arithmetic(self):
+    left = LinearForm({'x': 1, 'y': 2}, 3)
+    right = LinearForm({'y': 2, 'z': 1}, -1)
+    self.assertEqual(left + right, LinearForm({'x': 1, 'y': 4, 'z': 1}, 2))
+    self.assertEqual(left - right, LinearForm({'x': 1, 'z': -1}, 4))
+    self.assertEqual(2 * left, LinearForm({'x': 2, 'y': 4}, 6))
+    self.assertEqual(left.scale(0), LinearForm())
+
+  def test_substitute(self):
+    form = LinearForm({'x': 2, 'y': 1}, 1)
+    substitution = form.substitute('x', LinearForm({'z': 1}, 3))
+    self.assertEqual(substitution, LinearForm({'y': 1, 'z': 2}, 7))
+    self.assertIs(form.substitute('w', LinearForm()), form)
+
+  def test_isolate(self):
+    form = LinearForm({'x': 2, 'y': 4}, -6)
+    self.assertEqual(form.isolate('x'), LinearForm({'y': -2}, 3))
+    self.assertIsNone(form.isolate('z'))
+
+  def test_round_trip(self):
+    form = LinearForm({'x': 2, 'y': 1}, -4)
+    self.assertEqual(LinearForm.from_expression(form.to_expression()), form)
+
+  def test_equation_linear_form(self):
+    equation = Equation(3 * x - y - 7)
+    self.assertEqual(equation.linear_form, LinearForm({'x': 3, 'y': -1}, -7))
+    self.assertIs(equation.linear_form, equation.linear_form)
+    self.assertIsNone(Equation(x * y).linear_form)
+
+  def test_equation_from_linear_form(self):
+    form = LinearForm({'x': 1}, -2)
+    equation = form.to_equation()
+    self.assertIs(equation.linear_form, form)
+    self.assertEqual(equation, Equation(x + -2))
+
+
+if __name__ == '__main__':
+  unittest.main()
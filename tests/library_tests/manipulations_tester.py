@@ -1,3 +1,6 @@
+import sys
+import threading
+import tracemalloc
 import unittest
 
 from library import *
@@ -118,6 +121,149 @@ class ManipulationsTester(unittest.TestCase):
       right_substitution = substitute(y.name, replacement, expression)
       self.assertEqual(right_substitution, operation(x, replacement))
 
+  def test_substitute_all(self):
+    expression = x * (y - z) / (x + a)
+    substitution = substitute_all(
+      {'x': LiteralExpression(2), 'z': y + b}, expression)
+    self.assertEqual(substitution, 2 * (y - (y + b)) / (2 + a))
+    self.assertIs(substitute_all({'c': y}, expression), expression)
+
+  def test_substitute_all_statements(self):
+    first = Equation(x + y)
+    second = Equation(z - 1)
+    system = ConstraintSystem([first, second])
+    substitution = substitute_all({'x': a}, system)
+    self.assertEqual(substitution, ConstraintSystem([Equation(a + y), second]))
+    self.assertIs(substitution.constraints[1], second)
+    self.assertIs(substitute_all({'c': a}, system), system)
+
+  def test_deep_expressions(self):
+    depth = 5 * sys.getrecursionlimit()
+    expression = x
+    for i in range(depth):
+      expression = expression + VariableExpression(f'v{i}')
+    self.assertIs(expand(expression), expression)
+    self.assertEqual(len(collect_variables(expression)), depth + 1)
+    self.assertFalse(is_undefined(expression))
+    form = LinearForm.from_expression(expression)
+    self.assertEqual(form.coefficient('v7'), 1)
+    bindings = {f'v{i}': LiteralExpression(1) for i in range(depth)}
+    bindings['x'] = LiteralExpression(1)
+    self.assertEqual(evaluate(substitute_all(bindings, expression)), depth + 1)
+    variables = [VariableExpression(f'v{i}') for i in range(depth)]
+    right_nested = variables[-1]
+    for variable in reversed(variables[:-1]):
+      right_nested = variable + right_nested
+    left_deep = variables[0]
+    for variable in variables[1:]:
+      left_deep = left_deep + variable
+    self.assertIs(expand(right_nested), left_deep)
+    difference = variables[0]
+    for variable in variables[1:]:
+      difference = difference - variable
+    expansion = expand(difference)
+    self.assertIs(expand(expansion), expansion)
+    form = LinearForm.from_expression(expansion)
+    self.assertEqual(form.coefficient('v0'), 1)
+    self.assertEqual(form.coefficient('v7'), -1)
+    product = expand(2 * difference * (y + 1))
+    form = LinearForm.from_expression(substitute_all(
+      {'y': LiteralExpression(2)}, product))
+    self.assertEqual(form.coefficient('v0'), 6)
+    self.assertEqual(form.coefficient(f'v{depth - 1}'), -6)
+
+  def test_interning(self):
+    self.assertIs(VariableExpression('x'), x)
+    self.assertIs(x * (y + 5), x * (y + 5))
+    self.assertIsNot(x * (y + 5), x * (y + 6))
+    self.assertIsNot(x + y, x * y)
+    self.assertEqual(LiteralExpression(5), LiteralExpression(5.0))
+    self.assertIs(LiteralExpression(5.0).type, float)
+    self.assertEqual(x + 5, x + 5.0)
+    kept = [x + True, x + 1.0, x - 1.0, x * 2.0, x / 2.0]
+    self.assertIs((x + 1).right.type, int)
+    self.assertEqual(str(x + 1), '(x + 1)')
+    self.assertIsNot(x + 1, kept[0])
+    self.assertIsNot(x + 1, kept[1])
+    self.assertIs((x - 1).right.type, int)
+    self.assertIs((x * 2).right.type, int)
+    self.assertIs((x / 2).right.type, int)
+
+  def test_concurrent_interning(self):
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+      for i in range(50):
+        barrier = threading.Barrier(8)
+        results = []
+        def build():
+          barrier.wait()
+          results.append(VariableExpression(f'threaded{i}') + i)
+        threads = [threading.Thread(target=build) for _ in range(8)]
+        for thread in threads:
+          thread.start()
+        for thread in threads:
+          thread.join()
+        for result in results:
+          self.assertIs(result, results[0])
+    finally:
+      sys.setswitchinterval(interval)
+
+  def test_hashing(self):
+    cache = {x * (y + 5): 1, Equation(x - y): 2}
+    self.assertEqual(cache[x * (y + 5)], 1)
+    self.assertEqual(cache[Equation(x - y)], 2)
+    self.assertEqual(hash(x + 5), hash(x + 5.0))
+    self.assertEqual(len({expand(x * (y + z)), x * y + x * z}), 1)
+
+  def test_unhashable_literal(self):
+    expression = x + LiteralExpression([1])
+    self.assertEqual(expression, x + LiteralExpression([1]))
+    self.assertNotEqual(expression, x + LiteralExpression([2]))
+    self.assertRaises(TypeError, hash, expression)
+
+  def test_immutable_nodes(self):
+    expression = x + y
+    self.assertFalse(hasattr(expression, '__dict__'))
+    with self.assertRaises(AttributeError):
+      expression._left = z
+    with self.assertRaises(AttributeError):
+      expression.cache = None
+    self.assertIs(expression.left, x)
+
+  def test_node_memory_budget(self):
+    self.assertLessEqual(sys.getsizeof(x + y), 64)
+    literals = [LiteralExpression(i) for i in range(10000)]
+    tracemalloc.start()
+    try:
+      start = tracemalloc.get_traced_memory()[0]
+      nodes = [x + literal for literal in literals]
+      size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+      tracemalloc.stop()
+    self.assertLessEqual(size / len(nodes), 256)
+
+  def test_manipulation_cache(self):
+    cache = ManipulationCache(2)
+    previous = set_manipulation_cache(cache)
+    try:
+      expression = x * (y + z)
+      expansion = expand(expression)
+      self.assertIs(expand(x * (y + z)), expansion)
+      self.assertEqual(cache.hits, 1)
+      variables = collect_variables(expression)
+      variables.add('w')
+      self.assertEqual(collect_variables(expression), {'x', 'y', 'z'})
+      self.assertEqual(isolate('x', Equation(x - y)), y)
+      self.assertEqual(len(cache), 2)
+      self.assertGreater(cache.misses, 0)
+      cache.clear()
+      self.assertEqual(len(cache), 0)
+      self.assertEqual(cache.hits, 0)
+    finally:
+      set_manipulation_cache(previous)
+    self.assertIsNone(get_manipulation_cache())
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,117 @@
+import io
+import mmap
+import os
+import tempfile
+import unittest
+
+from library import *
+
+
+class ParserTester(unittest.TestCase):
+  def test_parse(self):
+    system = parse('a + 2 * (b - 3.5) = c / 4\n\n  x = 0\ny\n')
+    self.assertEqual(len(system.constraints), 3)
+    a = VariableExpression('a')
+    b = VariableExpression('b')
+    c = VariableExpression('c')
+    self.assertEqual(system.constraints[0], Equation(SubtractionExpression(
+      AdditionExpression(a, MultiplicationExpression(LiteralExpression(2.0),
+      SubtractionExpression(b, LiteralExpression(3.5)))),
+      DivisionExpression(c, LiteralExpression(4.0)))))
+    self.assertEqual(system.constraints[1], Equation(VariableExpression('x')))
+    self.assertEqual(system.constraints[2], VariableExpression('y'))
+
+  def test_variable_names(self):
+    system = parse('item.top + .5 = a1b.2\n')
+    self.assertEqual(system.constraints[0], Equation(SubtractionExpression(
+      AdditionExpression(VariableExpression('item.top'),
+      VariableExpression('.5')), VariableExpression('a1b.2'))))
+
+  def test_syntax_errors(self):
+    with self.assertRaisesRegex(RuntimeError, 'Syntax error at 4.'):
+      parse('a = * b')
+    with self.assertRaisesRegex(RuntimeError, 'Syntax error at 10.'):
+      parse('a = b\nc = )')
+    with self.assertRaisesRegex(RuntimeError, 'Operator expected.'):
+      parse('a b = c')
+    with self.assertRaisesRegex(RuntimeError, 'Operator expected.'):
+      parse('1.2.3 = a')
+
+  def test_linear_parse(self):
+    source = 'a.left - b.left - 2 * (b.width / 4) = 3\nq * a.left = 1\nb.left\n'
+    system = parse(source, linear=True)
+    constraint = system.constraints[0]
+    self.assertFalse(constraint.has_expression)
+    self.assertEqual(constraint.linear_form,
+      LinearForm({'a.left': 1, 'b.left': -1, 'b.width': -0.5}, -3))
+    self.assertEqual(collect_variables(constraint),
+      {'a.left', 'b.left', 'b.width'})
+    expected = parse(source)
+    self.assertEqual(system.constraints[1], expected.constraints[1])
+    self.assertEqual(system.constraints[2], expected.constraints[2])
+    with self.assertRaisesRegex(RuntimeError, 'Syntax error at 6.'):
+      parse('a = b\n= c', linear=True)
+
+  def test_linear_parse_solution(self):
+    source = 'a = 2 * b\nb + c = 10\nc = 4\nd * c = 8\n'
+    solution = solve_linear(parse(source, linear=True))
+    expected = solve_linear(parse(source))
+    self.assertEqual(solution.assignments, expected.assignments)
+    self.assertEqual(solution.assignments['a'], 12)
+
+  def test_linear_parse_cancellation(self):
+    for source in ['a - a = 0\n', 'a + b - b = 3\n', 'x = 1\ny - y + x = 1\n']:
+      system = parse(source, linear=True)
+      expected = parse(source)
+      self.assertEqual(solve(system), solve(expected))
+      self.assertEqual(solve_linear(system), solve_linear(expected))
+      str(system)
+      self.assertEqual(solve(system), solve(expected))
+    self.assertEqual(solve(parse('a - a = 0', linear=True)).underdetermined,
+      {'a'})
+
+  def test_iter_parse(self):
+    source = 'a = b + 1\n\nc = 2 * a\n'
+    expected = parse(source).constraints
+    self.assertEqual(list(iter_parse(source)), expected)
+    self.assertEqual(list(iter_parse(io.StringIO(source))), expected)
+    self.assertEqual(
+      list(iter_parse(io.BytesIO(source.encode('utf-8')))), expected)
+    parser = iter_parse(io.StringIO('a = 1\nb = =\n'))
+    self.assertEqual(next(parser), Equation(SubtractionExpression(
+      VariableExpression('a'), LiteralExpression(1.0))))
+    with self.assertRaisesRegex(RuntimeError, 'Syntax error at 10.'):
+      next(parser)
+
+  def test_iter_parse_mmap(self):
+    source = ''.join(f'x{i} = y{i} * 2\n' for i in range(100))
+    descriptor, path = tempfile.mkstemp()
+    try:
+      with os.fdopen(descriptor, 'wb') as file:
+        file.write(source.encode('utf-8'))
+      with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory:
+          constraints = list(iter_parse(memory))
+    finally:
+      os.remove(path)
+    self.assertEqual(constraints, parse(source).constraints)
+
+  def test_parse_parallel(self):
+    source = ''.join(f'x{i} + é{i} = 2 * y{i}\n\n' for i in range(200))
+    descriptor, path = tempfile.mkstemp()
+    try:
+      with os.fdopen(descriptor, 'wb') as file:
+        file.write(source.encode('utf-8'))
+      self.assertEqual(parse_parallel(path, 3), parse(source))
+      self.assertEqual(parse_parallel(path, 1), parse(source))
+      for workers in [0, -1]:
+        with self.assertRaisesRegex(
+            RuntimeError, f'Invalid number of workers {workers}.'):
+          parse_parallel(path, workers)
+      with open(path, 'ab') as file:
+        file.write('a = é + 1\nb = )\n'.encode('utf-8'))
+      with self.assertRaisesRegex(
+          RuntimeError, f'Syntax error at {len(source) + 14}.'):
+        parse_parallel(path, 4)
+    finally:
+      os.remove(path)
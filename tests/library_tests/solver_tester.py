@@ -1,3 +1,6 @@
+import concurrent.futures
+import pickle
+import sys
 import unittest
 
 from library import *
@@ -238,6 +241,121 @@ class SolverTester(unittest.TestCase):
     x_isolate = isolate('x', expression)
     self.assertEqual(x_isolate, None)
 
+  def test_linear_matches_symbolic(self):
+    system = ConstraintSystem([Equation(x - 2 * y + 3 * z - 9),
+      Equation(3 * y - x - z + 6), Equation(2 * x - 5 * y + 5 * z - 17),
+      Equation(a - x - 1)])
+    self.assertSolutionEqual(solve_linear(system), solve_symbolic(system))
+
+  def test_linear_inconsistent_propagation(self):
+    system = ConstraintSystem(
+      [Equation(x - 1), Equation(x - 2), Equation(y - x)])
+    self.assertSolutionEqual(solve_linear(system), solve_symbolic(system))
+    self.assertSolutionEqual(
+      solve_linear(system), Solution(inconsistencies={'x', 'y'}))
+    system = ConstraintSystem([Equation(a + 2 * c - 4),
+      Equation(2 * b - 2 * c - 2 * a - 9), Equation(c - 2), Equation(a - 7),
+      Equation(z - 3)])
+    self.assertSolutionEqual(solve_linear(system), solve_symbolic(system))
+    self.assertSolutionEqual(solve_linear(system),
+      Solution({'z': 3}, inconsistencies={'a', 'b', 'c'}))
+
+  def test_linear_inconsistent_term_order(self):
+    solutions = []
+    for first in [2 * a + 2 * b + c - 2, 2 * b + 2 * a + c - 2]:
+      system = ConstraintSystem(
+        [Equation(first), Equation(c - 4), Equation(2 * c)])
+      self.assertSolutionEqual(solve_linear(system), solve_symbolic(system))
+      solutions.append(solve_linear(system))
+      system = ConstraintSystem(list(reversed(system.constraints)))
+      solutions.append(solve_linear(system))
+    for solution in solutions:
+      self.assertSolutionEqual(
+        solution, Solution(inconsistencies={'a', 'b', 'c'}))
+
+  def test_linear_non_linear_system(self):
+    system = ConstraintSystem([Equation(x * y - 1), Equation(x - y)])
+    self.assertIsNone(solve_linear(system))
+
+  def test_linear_deferred_non_linear_equation(self):
+    system = ConstraintSystem(
+      [Equation(x * (y - 100) - z), Equation(x - 2), Equation(y - 150)])
+    self.assertSolutionEqual(
+      solve_linear(system), Solution({'x': 2, 'y': 150, 'z': 100}))
+
+  def test_parametric_solution(self):
+    system = ConstraintSystem([Equation(x + y - a), Equation(x - y - 2 * b),
+      Equation(z * (a - 10) - x), Equation(z - 3), Equation(b - 5)])
+    solution = solve_parametric(system, {'a', 'b'})
+    self.assertEqual(solution.forms['y'], LinearForm({'a': 0.5, 'b': -1}))
+    self.assertEqual(len(solution.constraints), 2)
+    self.assertTrue(solution.is_satisfied({'a': 14, 'b': 5}))
+    self.assertFalse(solution.is_satisfied({'a': 40, 'b': 5}))
+    self.assertSolutionEqual(
+      solution.evaluate({'a': 14, 'b': 5}), solve(system))
+
+  def test_linear_long_chain(self):
+    count = 2000
+    equations = [Equation(VariableExpression('v0') - 1)]
+    for i in range(1, count):
+      equations.append(Equation(VariableExpression(f'v{i}') -
+        VariableExpression(f'v{i - 1}') - 1))
+    solution = solve(ConstraintSystem(equations))
+    self.assertTrue(solution.is_solved)
+    self.assertAlmostEqual(solution.assignments[f'v{count - 1}'], count)
+
+  def test_symbolic_long_chain(self):
+    count = 1500
+    equations = [Equation(VariableExpression('v0') - 1)]
+    for i in range(1, count):
+      equations.append(Equation(VariableExpression(f'v{i}') -
+        VariableExpression(f'v{i - 1}') - 1))
+    solution = solve_symbolic(ConstraintSystem(equations))
+    self.assertTrue(solution.is_solved)
+    self.assertAlmostEqual(solution.assignments[f'v{count - 1}'], count)
+
+  def test_decompose(self):
+    equations = [Equation(x + y - 1), Equation(a - 2), Equation(y - z),
+      Equation(LiteralExpression(0)), Equation(b - a)]
+    components = decompose(ConstraintSystem(equations))
+    self.assertEqual(components, [
+      ConstraintSystem([equations[0], equations[2]]),
+      ConstraintSystem([equations[1], equations[4]]),
+      ConstraintSystem([equations[3]])])
+
+  def test_solve_independent_subsystems(self):
+    equations = [Equation(x + 1), Equation(a - b), Equation(x + 2),
+      Equation(LiteralExpression(3)), Equation(y * z - 6), Equation(y - 2)]
+    solution = solve(ConstraintSystem(equations))
+    self.assertSolutionEqual(solution, Solution({'y': 2, 'z': 3},
+      underdetermined={'a', 'b'}, inconsistencies={'x'}))
+
+  def test_pickle_statements(self):
+    system = ConstraintSystem(
+      [Equation(x * (y - 2) / z + 1), Equation(a - b), Equation(x * y)])
+    system.constraints[1].linear_form
+    self.assertEqual(pickle.loads(pickle.dumps(system)), system)
+    self.assertIs(pickle.loads(pickle.dumps(UNDERDETERMINED)), UNDERDETERMINED)
+
+  def test_pickle_deep_expression(self):
+    expression = x
+    for i in range(5 * sys.getrecursionlimit()):
+      expression = expression + 2 * VariableExpression(f'v{i}')
+    self.assertIs(pickle.loads(pickle.dumps(expression)), expression)
+
+  def test_solve_concurrently(self):
+    equations = []
+    for i in range(20):
+      u = VariableExpression(f'u{i}')
+      v = VariableExpression(f'v{i}')
+      equations.append(Equation(u + v - i))
+      equations.append(Equation(u - v))
+    system = ConstraintSystem(equations)
+    expected = solve(system)
+    self.assertEqual(solve(system, workers=2), expected)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+      self.assertEqual(solve(system, executor=executor), expected)
+
 
 if __name__ == '__main__':
   unittest.main()
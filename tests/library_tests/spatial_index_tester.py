@@ -0,0 +1,42 @@
+import random
+import unittest
+
+from library import *
+
+
+class SpatialIndexTester(unittest.TestCase):
+  def test_empty_index(self):
+    index = SpatialIndex([])
+    self.assertEqual(len(index), 0)
+    self.assertEqual(index.query_point(0, 0), [])
+
+  def test_point_query(self):
+    index = SpatialIndex([(0, 0, 9, 9, 'a'), (0, 10, 9, 19, 'b')])
+    self.assertEqual(index.query_point(5, 5), ['a'])
+    self.assertEqual(index.query_point(9, 9), ['a'])
+    self.assertEqual(index.query_point(10, 0), ['b'])
+    self.assertEqual(index.query_point(20, 0), [])
+
+  def test_matches_linear_scan(self):
+    generator = random.Random(7)
+    entries = []
+    for i in range(2000):
+      top = generator.randrange(1000)
+      left = generator.randrange(1000)
+      entries.append((top, left, top + generator.randrange(50),
+        left + generator.randrange(50), i))
+    index = SpatialIndex(entries, 8)
+    self.assertEqual(len(index), len(entries))
+    for _ in range(200):
+      top = generator.randrange(1000)
+      left = generator.randrange(1000)
+      bottom = top + generator.randrange(100)
+      right = left + generator.randrange(100)
+      expected = [entry[4] for entry in entries if entry[0] <= bottom and
+        entry[2] >= top and entry[1] <= right and entry[3] >= left]
+      self.assertEqual(
+        sorted(index.query_rect(top, left, bottom, right)), expected)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,101 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from library import *
+
+
+class SystemCacheTester(unittest.TestCase):
+  def test_parse(self):
+    source = 'a = 2 * b\nb = 3\n'
+    with tempfile.TemporaryDirectory() as directory:
+      cache = SystemCache(directory)
+      system = cache.parse(source)
+      self.assertEqual(system, parse(source))
+      self.assertEqual((cache.hits, cache.misses), (0, 1))
+      other_cache = SystemCache(directory)
+      self.assertEqual(other_cache.parse(source), system)
+      self.assertEqual((other_cache.hits, other_cache.misses), (1, 0))
+      linear_system = other_cache.parse(source, linear=True)
+      self.assertFalse(linear_system.constraints[0].has_expression)
+      self.assertEqual(other_cache.misses, 1)
+      self.assertEqual(other_cache.lookup('a = 1', 'system'), (False, None))
+      self.assertEqual(
+        [name for name in os.listdir(directory) if name.endswith('.tmp')], [])
+
+  def test_eviction(self):
+    with tempfile.TemporaryDirectory() as directory:
+      cache = SystemCache(directory, 1)
+      cache.store('a', 'text', 'x' * 100)
+      self.assertEqual(cache.lookup('a', 'text'), (False, None))
+      cache = SystemCache(directory, 1000)
+      cache.store('a', 'text', 'x' * 400)
+      cache.store('b', 'text', 'y' * 400)
+      os.utime(cache.get_path('a', 'text'), (0, 0))
+      cache.store('c', 'text', 'z' * 400)
+      self.assertFalse(cache.lookup('a', 'text')[0])
+      self.assertEqual(cache.lookup('b', 'text'), (True, 'y' * 400))
+      self.assertEqual(cache.lookup('c', 'text'), (True, 'z' * 400))
+      cache.clear()
+      self.assertEqual(os.listdir(directory), [])
+
+  def test_invalid_entries(self):
+    with tempfile.TemporaryDirectory() as directory:
+      cache = SystemCache(directory)
+      path = cache.get_path('a = 1', 'system')
+      for contents in [b'', b'garbage', b'\x80\x04\x95']:
+        with open(path, 'wb') as file:
+          file.write(contents)
+        self.assertEqual(cache.lookup('a = 1', 'system'), (False, None))
+        self.assertFalse(os.path.exists(path))
+      with open(path, 'wb') as file:
+        file.write(b'garbage')
+      self.assertEqual(cache.parse('a = 1'), parse('a = 1'))
+      self.assertEqual(cache.lookup('a = 1', 'system'), (True, parse('a = 1')))
+
+  def test_temporary_files(self):
+    with tempfile.TemporaryDirectory() as directory:
+      cache = SystemCache(directory, 1000)
+      stale_path = os.path.join(directory, '.stale.tmp')
+      with open(stale_path, 'wb') as file:
+        file.write(b'x' * 100)
+      os.utime(stale_path, (0, 0))
+      pending_path = os.path.join(directory, '.pending.tmp')
+      with open(pending_path, 'wb') as file:
+        file.write(b'x' * 800)
+      cache.store('a', 'text', 'a' * 400)
+      self.assertFalse(os.path.exists(stale_path))
+      self.assertTrue(os.path.exists(pending_path))
+      self.assertEqual(cache.lookup('a', 'text'), (False, None))
+      os.utime(pending_path, (0, 0))
+      cache.store('a', 'text', 'a' * 400)
+      self.assertFalse(os.path.exists(pending_path))
+      self.assertEqual(cache.lookup('a', 'text'), (True, 'a' * 400))
+
+  def test_layout(self):
+    def build(source):
+      items = [LayoutItem(name, 0, 100 * i, 100, LayoutPolicy.EXPANDING, 50,
+        LayoutPolicy.FIXED) for (i, name) in enumerate(source.split())]
+      return Layout(items, [])
+    with tempfile.TemporaryDirectory() as directory:
+      cache = SystemCache(directory)
+      layout = cache.get_layout('A B', build)
+      compiled_layout = cache.get_layout('A B', build)
+      self.assertEqual((cache.hits, cache.misses), (1, 1))
+      self.assertEqual(compiled_layout.items, layout.items)
+      layout.resize(400, 50)
+      compiled_layout.resize(400, 50)
+      self.assertEqual(compiled_layout.items, layout.items)
+      path = cache.get_path('A B', 'layout')
+      with open(path, 'rb') as file:
+        contents = file.read()
+      for invalid_contents in [b'garbage', contents[:-1],
+          struct.pack('<4sH', b'LYTC', 1) + contents[6:]]:
+        with open(path, 'wb') as file:
+          file.write(invalid_contents)
+        self.assertEqual(
+          cache.get_layout('A B', build).items, build('A B').items)
+        self.assertEqual(
+          cache.get_layout('A B', build).items, build('A B').items)
+      self.assertEqual((cache.hits, cache.misses), (4, 4))
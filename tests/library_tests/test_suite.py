@@ -1,15 +1,25 @@
 import unittest
 
+from tests.library_tests.compiler_tester import CompilerTester
 from tests.library_tests.layout_tester import LayoutTester
+from tests.library_tests.linear_form_tester import LinearFormTester
 from tests.library_tests.manipulations_tester import ManipulationsTester
+from tests.library_tests.parser_tester import ParserTester
 from tests.library_tests.solver_tester import SolverTester
+from tests.library_tests.spatial_index_tester import SpatialIndexTester
+from tests.library_tests.system_cache_tester import SystemCacheTester
 
 
 def suite():
   suite = unittest.TestSuite()
+  suite.addTest(unittest.makeSuite(CompilerTester))
+  suite.addTest(unittest.makeSuite(LinearFormTester))
   suite.addTest(unittest.makeSuite(ManipulationsTester))
+  suite.addTest(unittest.makeSuite(ParserTester))
   suite.addTest(unittest.makeSuite(SolverTester))
+  suite.addTest(unittest.makeSuite(SpatialIndexTester))
   suite.addTest(unittest.makeSuite(LayoutTester))
+  suite.addTest(unittest.makeSuite(SystemCacheTester))
   return suite
 
 